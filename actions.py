@@ -0,0 +1,155 @@
+from itertools import product
+
+import numpy
+
+from player import WAIT
+
+# Cards are numbered 13 * suit + value; attack and bounce subsets are numbered 15 * value + (suit bitmask - 1).
+CARDS = numpy.arange(52)
+SUITS = CARDS // 13
+VALUES = CARDS % 13
+
+
+def subsetSuits(subset):
+    return tuple(suit for suit in range(4) if (subset + 1) >> suit & 1)
+
+
+class ActionSpace:
+    # A fixed numbering of every Durak action, laid out as consecutive blocks:
+    #   attack:  one per (value, non-empty set of suits)                 13 * 15
+    #   defend:  one per (defending card, attacking card)                52 * 52
+    #   bounce:  one per (value, non-empty set of suits)                 13 * 15
+    #   concede: one per non-empty set of positions among the open attacks, in the order getCards lists them
+    #   join:    one per card                                            52
+    #   decline, wait
+    def __init__(self, maxAttacks):
+        self.maxAttacks = maxAttacks
+        # Attacks and bounces can put up to four cards of one value on the table regardless of maxAttacks.
+        self.maxOpenAttacks = max(maxAttacks, 4)
+
+        self.attack = 0
+        self.defend = self.attack + 13 * 15
+        self.bounce = self.defend + 52 * 52
+        self.concede = self.bounce + 13 * 15
+        self.join = self.concede + 2 ** self.maxOpenAttacks - 1
+        self.decline = self.join + 52
+        self.wait = self.decline + 1
+        self.size = self.wait + 1
+
+        self.subsetCards = numpy.zeros((13 * 15, 52), dtype=int)
+        self.subsetValues = numpy.repeat(numpy.arange(13), 15)
+        for value, subset in product(range(13), range(15)):
+            for suit in subsetSuits(subset):
+                self.subsetCards[15 * value + subset, 13 * suit + value] = 1
+        self.subsetSizes = self.subsetCards.sum(axis=1)
+
+        # beats[defending card, attacking card], ignoring trumps
+        self.sameSuitHigher = (SUITS[:, None] == SUITS[None, :]) & (VALUES[:, None] > VALUES[None, :])
+        self.differentSuit = SUITS[:, None] != SUITS[None, :]
+
+        masks = numpy.arange(1, 2 ** self.maxOpenAttacks)
+        self.concedePositions = (masks[:, None] >> numpy.arange(self.maxOpenAttacks)) & 1 == 1
+        self.concedeSizes = self.concedePositions.sum(axis=1)
+        self.concedeSpan = numpy.array([int(mask).bit_length() for mask in masks])
+
+    def legalMask(self, observations):
+        # Which actions are legal in each observation of shape (..., 8, 4, 13), in the layout of Game._playerState.
+        # This follows the same case analysis as Player.actionGroups, using only array operations.
+        shape = observations.shape[:-3]
+        observations = observations.reshape(-1, 8, 52)
+        hand = observations[:, 0] == 1
+        trumps = observations[:, 1] == 1
+        openAttacks = observations[:, 2] == 1
+        closedAttacks = observations[:, 3] == 1
+        defences = observations[:, 4] == 1
+        isAttacker = observations[:, 6, 0] == 0
+        isDefender = observations[:, 7, 0] == 0
+
+        numberOfOpenAttacks = openAttacks.sum(axis=1)
+        numberOfClosedAttacks = closedAttacks.sum(axis=1)
+        numberOfDefences = defences.sum(axis=1)
+
+        defending = isDefender & (numberOfOpenAttacks > 0)
+        attacking = ~isDefender & isAttacker & (numberOfOpenAttacks + numberOfClosedAttacks == 0)
+        joining = ~isDefender & ~attacking & (numberOfDefences > 0) \
+            & (numberOfOpenAttacks + numberOfClosedAttacks < self.maxAttacks)
+
+        mask = numpy.zeros((observations.shape[0], self.size), dtype=bool)
+        subsetsHeld = hand.astype(int) @ self.subsetCards.T == self.subsetSizes
+
+        mask[:, self.attack:self.defend] = attacking[:, None] & subsetsHeld
+
+        beats = self.sameSuitHigher | self.differentSuit & trumps[:, :, None]
+        defend = defending[:, None, None] & hand[:, :, None] & openAttacks[:, None, :] & beats
+        mask[:, self.defend:self.bounce] = defend.reshape(-1, 52 * 52)
+
+        # Bounces must match the value of the first open attack.
+        attackValue = VALUES[numpy.argmax(openAttacks, axis=1)]
+        bouncing = defending & (numberOfClosedAttacks + numberOfDefences == 0)
+        mask[:, self.bounce:self.concede] = bouncing[:, None] & subsetsHeld \
+            & (self.subsetValues[None, :] == attackValue[:, None])
+
+        # Concede everything, unless there are more open attacks than cards in hand.
+        surplus = numberOfOpenAttacks - hand.sum(axis=1)
+        withinTable = self.concedeSpan[None, :] <= numberOfOpenAttacks[:, None]
+        concedeAll = self.concedeSizes[None, :] == numberOfOpenAttacks[:, None]
+        concedeSurplus = self.concedeSizes[None, :] == surplus[:, None]
+        mask[:, self.concede:self.join] = defending[:, None] & withinTable \
+            & numpy.where((surplus > 0)[:, None], concedeSurplus, concedeAll)
+
+        tableValues = numpy.any((closedAttacks | defences).reshape(-1, 4, 13), axis=1)
+        mask[:, self.join:self.decline] = joining[:, None] & hand & tableValues[:, VALUES]
+        mask[:, self.decline] = joining
+
+        mask[:, self.wait] = ~numpy.any(mask, axis=1)
+        return mask.reshape(shape + (self.size,))
+
+    def decode(self, index, observation):
+        # The action tuple, as Player would build it, for an action index that is legal in this observation.
+        index = int(index)
+        if index < self.defend:
+            return self._sameValueAction('attack', index - self.attack)
+        elif index < self.bounce:
+            (defendingCard, attackingCard) = divmod(index - self.defend, 52)
+            return ('defend', divmod(defendingCard, 13), divmod(attackingCard, 13))
+        elif index < self.concede:
+            return self._sameValueAction('bounce', index - self.bounce)
+        elif index < self.join:
+            openAttacks = numpy.nonzero(observation[2].reshape(52) == 1)[0]
+            positions = self.concedePositions[index - self.concede][:len(openAttacks)]
+            (suits, values) = numpy.divmod(openAttacks[positions], 13)
+            return ('concede', (tuple(suits.tolist()), tuple(values.tolist())))
+        elif index < self.decline:
+            return ('joinAttack', divmod(index - self.join, 13))
+        elif index == self.decline:
+            return ('declineToAttack',)
+        return WAIT
+
+    def encode(self, action, observation):
+        (kind, *args) = action
+        if kind in ('attack', 'bounce'):
+            (suits, values) = args[0]
+            subset = sum(1 << int(suit) for suit in suits) - 1
+            return (self.attack if kind == 'attack' else self.bounce) + 15 * int(values[0]) + subset
+        elif kind == 'defend':
+            (defendingCard, attackingCard) = args
+            return self.defend + 52 * cardIndex(defendingCard) + cardIndex(attackingCard)
+        elif kind == 'concede':
+            openAttacks = numpy.nonzero(observation[2].reshape(52) == 1)[0].tolist()
+            conceded = {cardIndex(card) for card in zip(*args[0])}
+            mask = sum(1 << position for position, card in enumerate(openAttacks) if card in conceded)
+            return self.concede + mask - 1
+        elif kind == 'joinAttack':
+            return self.join + cardIndex(args[0])
+        elif kind == 'declineToAttack':
+            return self.decline
+        return self.wait
+
+    def _sameValueAction(self, kind, index):
+        (value, subset) = divmod(index, 15)
+        suits = subsetSuits(subset)
+        return (kind, (suits, (value,) * len(suits)))
+
+
+def cardIndex(card):
+    return 13 * int(card[0]) + int(card[1])
@@ -0,0 +1,245 @@
+import numpy
+
+
+class BatchGame:
+    # Many games held as one (games, players + 6, 4, 13) tensor with the same layout as Game.state.
+    # Every action takes a boolean 'games' mask saying which games it applies to, and (games, 4, 13) card masks,
+    # so one call advances every selected game at once. Games that have finished ignore further actions.
+    def __init__(self, numberOfGames, numberOfPlayers, minCards, maxAttacks, seed=None):
+        self.numberOfGames = numberOfGames
+        # All the batch's chance comes from its own generator, seeded like numpy.random.default_rng.
+        self.rng = numpy.random.default_rng(seed)
+        self.numberOfPlayers = numberOfPlayers
+        self.minCards = minCards
+        self.maxAttacks = maxAttacks
+
+        self.trumps = self.numberOfPlayers + 0
+        self.openAttacks = self.numberOfPlayers + 1
+        self.closedAttacks = self.numberOfPlayers + 2
+        self.defences = self.numberOfPlayers + 3
+        self.burned = self.numberOfPlayers + 4
+        self.pack = self.numberOfPlayers + 5
+
+        self.numberOfGlobalComponents = 6
+        self.games = numpy.arange(numberOfGames)
+
+        self.attacker = None
+        self.defender = None
+
+        self.declinedToAttack = numpy.zeros((numberOfGames, numberOfPlayers), dtype=bool)
+        self.activePlayers = numpy.ones((numberOfGames, numberOfPlayers), dtype=bool)
+
+        self.turns = numpy.zeros(numberOfGames, dtype=int)
+        self._initialiseState()
+
+    def _initialiseState(self):
+        shape = (self.numberOfGames, self.numberOfPlayers + self.numberOfGlobalComponents, 4, 13)
+        self.state = numpy.zeros(shape, dtype=int)
+
+        trumps = self.rng.integers(4, size=self.numberOfGames)
+        self.state[self.games, self.trumps, trumps] = 1
+        self.state[:, self.pack] = 1
+
+        self.attacker = self.rng.integers(self.numberOfPlayers, size=self.numberOfGames)
+        self.defender = (self.attacker + 1) % self.numberOfPlayers
+
+        self._pickUpCards(numpy.ones(self.numberOfGames, dtype=bool))
+
+    # Helpers
+
+    def numberOfCards(self, zone):
+        # 'zone' is either a single zone or one zone per game, e.g. each game's defender.
+        return self.state[self.games, zone].sum(axis=(1, 2))
+
+    def _moveCards(self, games, cards, fromZone, toZone):
+        cards = numpy.asarray(cards, dtype=bool) & games[:, None, None]
+        assert numpy.all(self.state[self.games, fromZone][cards] == 1)
+        self.state[self.games, fromZone] -= cards
+        self.state[self.games, toZone] += cards
+
+    def _moveAll(self, games, fromZone, toZone):
+        self._moveCards(games, self.state[self.games, fromZone] == 1, fromZone, toZone)
+
+    def _neighbour(self, player, direction):
+        # The next active player clockwise (direction 1) or anticlockwise (direction -1) in each game.
+        neighbour = player.copy()
+        found = numpy.zeros(self.numberOfGames, dtype=bool)
+        for distance in range(1, self.numberOfPlayers + 1):
+            candidate = (player + direction * distance) % self.numberOfPlayers
+            take = ~found & self.activePlayers[self.games, candidate]
+            neighbour[take] = candidate[take]
+            found |= take
+        return neighbour
+
+    def _nextPlayer(self, player):
+        return self._neighbour(player, 1)
+
+    def _previousPlayer(self, player):
+        return self._neighbour(player, -1)
+
+    def _updateAttackerAndDefender(self, games, newAttacker):
+        newDefender = self._nextPlayer(newAttacker)
+        self.attacker = numpy.where(games, newAttacker, self.attacker)
+        self.defender = numpy.where(games, newDefender, self.defender)
+
+    def _updatePlayers(self, games):
+        self.declinedToAttack[games] = False
+
+    def _pickUpCards(self, games):
+        # Ranking the pack by random keys shuffles every game's pack at once;
+        # each player then takes the next 'shortage' cards in rank order.
+        pack = self.state[:, self.pack].reshape(self.numberOfGames, 52) == 1
+        keys = numpy.where(pack, self.rng.random(pack.shape), numpy.inf)
+        ranks = numpy.argsort(numpy.argsort(keys, axis=1), axis=1)
+        dealt = numpy.zeros(self.numberOfGames, dtype=int)
+
+        # Defender picks up first, then attacker, then others.
+        player = self.defender
+        numberOfActivePlayers = self.activePlayers.sum(axis=1)
+        for i in range(self.numberOfPlayers):
+            picking = games & (i < numberOfActivePlayers)
+            shortage = numpy.maximum(self.minCards - self.numberOfCards(player), 0) * picking
+            newCards = pack & (ranks >= dealt[:, None]) & (ranks < (dealt + shortage)[:, None])
+            self._moveCards(picking, newCards.reshape(-1, 4, 13), self.pack, player)
+            pack &= ~newCards
+            dealt += newCards.sum(axis=1)
+            player = self._previousPlayer(player)
+
+        self._updatePlayers(games)
+
+    def _successfulDefence(self, games):
+        # Burn closed attacks and defences, but also burn any open attacks -
+        # the defender might just have used their last cards.
+        for category in [self.openAttacks, self.closedAttacks, self.defences]:
+            self._moveAll(games, category, self.burned)
+
+        self._updateAttackerAndDefender(games, self.defender)
+        self.turns += games
+        self._pickUpCards(games)
+
+    def _endGame(self, games):
+        # Give each loser all the cards so they know they've lost.
+        loser = self.loser()
+        for category in [self.openAttacks, self.closedAttacks, self.defences]:
+            self._moveAll(games, category, loser)
+
+    def _playing(self, games):
+        return numpy.asarray(games, dtype=bool) & ~self.finished()
+
+    # State
+
+    def finished(self):
+        return self.activePlayers.sum(axis=1) == 1
+
+    def loser(self):
+        # Only meaningful for finished games.
+        return numpy.argmax(self.activePlayers, axis=1)
+
+    def observe(self, player):
+        # The batched equivalent of Game._playerState: (games, 8, 4, 13), for one player (or one per game).
+        player = numpy.broadcast_to(player, (self.numberOfGames,))
+        attacker = (self.attacker - player) % self.numberOfPlayers
+        defender = (self.defender - player) % self.numberOfPlayers
+        zones = numpy.stack([
+            player,
+            *(numpy.full(self.numberOfGames, zone) for zone in
+              [self.trumps, self.openAttacks, self.closedAttacks, self.defences, self.burned])], axis=1)
+        observable = self.state[self.games[:, None], zones]
+        roles = numpy.broadcast_to(numpy.stack([attacker, defender], axis=1)[:, :, None, None],
+                                   (self.numberOfGames, 2, 4, 13))
+        return numpy.concatenate([observable, roles], axis=1)
+
+    # Actions: each applies to the games selected by the boolean mask 'games'.
+
+    def joinAttack(self, games, player, cards):
+        games = self._playing(games)
+        values = numpy.any(cards, axis=1)
+        table = numpy.any(self.state[:, [self.closedAttacks, self.defences]] == 1, axis=(1, 2))
+        totalAttacks = self.numberOfCards(self.openAttacks) + self.numberOfCards(self.closedAttacks)
+        assert numpy.all(~games | (cards.sum(axis=(1, 2)) == 1))
+        assert numpy.all(~games | numpy.any(values & table, axis=1))
+        assert numpy.all(~games | (totalAttacks < self.maxAttacks))
+
+        self._moveCards(games, cards, player, self.openAttacks)
+        self._updatePlayers(games)
+
+    def attack(self, games, cards):
+        games = self._playing(games)
+        # If attacking with multiple cards, check all the values are the same
+        assert numpy.all(~games | (numpy.any(cards, axis=1).sum(axis=1) == 1))
+
+        self._moveCards(games, cards, self.attacker, self.openAttacks)
+        self._updatePlayers(games)
+
+    def bounce(self, games, cards):
+        games = self._playing(games)
+        # Check there are only open attacks, and that these cards have the same value as them
+        onlyOpen = self.numberOfCards(self.closedAttacks) + self.numberOfCards(self.defences) == 0
+        attackValues = numpy.any(self.state[:, self.openAttacks] == 1, axis=1)
+        sameValue = numpy.all(~numpy.any(cards, axis=1) | attackValues, axis=1) & (attackValues.sum(axis=1) == 1)
+        assert numpy.all(~games | (onlyOpen & sameValue))
+
+        self._moveCards(games, cards, self.defender, self.openAttacks)
+        self._updateAttackerAndDefender(games, self.defender)
+        self._updatePlayers(games)
+
+    def defend(self, games, defendingCards, attackingCards):
+        games = self._playing(games)
+        assert numpy.all(~games | (attackingCards.sum(axis=(1, 2)) == 1) & (defendingCards.sum(axis=(1, 2)) == 1))
+        (attackingSuit, attackingValue) = numpy.divmod(attackingCards.reshape(-1, 52).argmax(axis=1), 13)
+        (defendingSuit, defendingValue) = numpy.divmod(defendingCards.reshape(-1, 52).argmax(axis=1), 13)
+        trumps = self.state[self.games, self.trumps, defendingSuit, 0] == 1
+        beats = (defendingSuit == attackingSuit) & (defendingValue > attackingValue) \
+            | (defendingSuit != attackingSuit) & trumps
+        assert numpy.all(~games | beats)
+
+        defender = self.defender
+        self._moveCards(games, attackingCards, self.openAttacks, self.closedAttacks)
+        self._moveCards(games, defendingCards, defender, self.defences)
+
+        self.declinedToAttack[self.games[games], defender[games]] = False
+
+        finished = (self.numberOfCards(self.defences) == self.maxAttacks) | (self.numberOfCards(defender) == 0)
+        self._successfulDefence(games & finished)
+        self._updatePlayers(games & ~finished)
+
+    def concede(self, games, attacksToConcede):
+        games = self._playing(games)
+        numberOfOpenAttacks = self.numberOfCards(self.openAttacks)
+        surplus = numberOfOpenAttacks - self.numberOfCards(self.defender)
+        conceding = attacksToConcede.sum(axis=(1, 2))
+        assert numpy.all(~games | (surplus <= 0) & (conceding == numberOfOpenAttacks)
+                         | (0 < surplus) & (surplus == conceding))
+
+        # Concede all the defences and closed attacks, then the selected open attacks, and burn any leftovers.
+        for category in [self.closedAttacks, self.defences]:
+            self._moveAll(games, category, self.defender)
+        self._moveCards(games, attacksToConcede, self.openAttacks, self.defender)
+        self._moveAll(games, self.openAttacks, self.burned)
+
+        self._updateAttackerAndDefender(games, self._nextPlayer(self.defender))
+        self.turns += games
+        self._pickUpCards(games)
+
+    def declineToAttack(self, games, player):
+        games = self._playing(games)
+        player = numpy.broadcast_to(player, (self.numberOfGames,))
+        self.declinedToAttack[self.games[games], player[games]] = True
+
+        decliners = (self.declinedToAttack & self.activePlayers).sum(axis=1)
+        everyoneDeclined = decliners == self.activePlayers.sum(axis=1) - 1
+        # If this call has ended the round then we must have a successful defence.
+        self._successfulDefence(games & everyoneDeclined & (self.numberOfCards(self.openAttacks) == 0))
+
+    def done(self, games, player):
+        games = self._playing(games)
+        player = numpy.broadcast_to(player, (self.numberOfGames,))
+        nextPlayer = self._nextPlayer(player)
+        wasAttacker = games & (player == self.attacker)
+        # A player can be made defender and only then declare themselves out: the next player defends instead.
+        wasDefender = games & (player == self.defender) & ~wasAttacker
+        self._updateAttackerAndDefender(wasAttacker, nextPlayer)
+        self.defender = numpy.where(wasDefender, nextPlayer, self.defender)
+        self.activePlayers[self.games[games], player[games]] = False
+        self._endGame(games & self.finished())
+        self._updatePlayers(games)
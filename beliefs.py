@@ -0,0 +1,152 @@
+import numpy
+
+
+class Beliefs:
+    # What a player believes about where the cards it can't see are, kept up to date from the differences between
+    # consecutive observations (in the layout of Game._playerState) rather than worked out from scratch each time.
+    #
+    # For each opponent (relative player 1, 2, ...) it tracks the cards they are known to hold - ones they picked
+    # up off the table - and their expected hand size. Every other unseen card is equally likely to be in any of
+    # the unknown parts of their hands or in the pack.
+    #
+    # Everything has a leading batch axis, so one tracker can follow many players or games at once; with
+    # batchSize=None it follows a single player and takes and returns unbatched arrays.
+    def __init__(self, numberOfPlayers, minCards, batchSize=None):
+        self.numberOfPlayers = numberOfPlayers
+        self.minCards = minCards
+        self.batched = batchSize is not None
+        self.batchSize = batchSize if self.batched else 1
+
+        self.known = numpy.zeros((self.batchSize, numberOfPlayers - 1, 52), dtype=bool)
+        self.hidden = numpy.zeros((self.batchSize, 52), dtype=bool)
+        self.handSizes = numpy.zeros((self.batchSize, numberOfPlayers - 1))
+        self.packSize = numpy.zeros(self.batchSize)
+
+        self.previous = numpy.zeros((self.batchSize, 6, 52), dtype=bool)
+        self.previousRoles = numpy.zeros((self.batchSize, 2), dtype=int)
+        self.initialised = numpy.zeros(self.batchSize, dtype=bool)
+
+    def reset(self, which=None):
+        # Forget everything for the selected batch entries, e.g. when their game restarts.
+        which = slice(None) if which is None else which
+        self.initialised[which] = False
+
+    def update(self, observations):
+        observations = numpy.asarray(observations).reshape(self.batchSize, 8, 52)
+        current = observations[:, :6] == 1
+        roles = observations[:, 6:, 0]
+
+        starting = ~self.initialised
+        if numpy.any(starting):
+            self._start(starting, current, roles)
+
+        previous = self.previous
+        (attacker, defender) = self.previousRoles.T
+        hand = current[:, 0]
+        table = current[:, 2] | current[:, 3] | current[:, 4]
+        previousTable = previous[:, 2] | previous[:, 3] | previous[:, 4]
+
+        # Unseen cards turning up on the table were played by an opponent. If we know who had the card, it was
+        # them; defences come from the defender; an opening attack from the attacker; a bounce from the old
+        # defender, who becomes the attacker. Anything else was added by one of the other attackers.
+        previouslySeen = previous[:, 0] | previousTable | previous[:, 5]
+        played = (table | current[:, 5]) & ~previouslySeen
+        holders = self.known & played[:, None, :]
+        self.handSizes -= holders.sum(axis=2)
+        self.known &= ~played[:, None, :]
+        unattributed = played & ~holders.any(axis=1)
+
+        defences = (unattributed & current[:, 4]).sum(axis=1)
+        attacks = (unattributed & ~current[:, 4]).sum(axis=1)
+        opening = ~previousTable.any(axis=1)
+        bounced = ~opening & (roles[:, 0] == defender)
+        self._play(defender, defences)
+        self._play(attacker, attacks * opening)
+        self._play(defender, attacks * bounced)
+        self._playByAnyAttacker(defender, attacks * (~opening & ~bounced))
+
+        # Cards leaving the table without being burned, or going to us, were picked up by the defender.
+        pickedUp = previousTable & ~table & ~current[:, 5] & ~hand
+        for opponent in range(1, self.numberOfPlayers):
+            picking = defender == opponent
+            self.known[picking, opponent - 1] |= pickedUp[picking]
+            self.handSizes[:, opponent - 1] += pickedUp.sum(axis=1) * picking
+
+        # When the table is cleared everyone refills their hand from the pack: the defender first, then the
+        # attacker, then the others. We see exactly what we drew; opponents draw what they need if it's there.
+        # Once attacks have been shared out between several attackers, opponents' hand sizes are only expected
+        # values, and what someone with an expected hand size needs to draw isn't what they'd need on average:
+        # with three or more players the pack size drifts from the truth. Drawing fewer cards than we needed is
+        # the one sure sign the pack has run out, so then everything the estimate still had in it goes to the
+        # opponents who drew before us.
+        dealtToUs = (self.hidden & hand).sum(axis=1)
+        self.hidden &= ~(played | hand)
+        dealing = previousTable.any(axis=1) & ~table.any(axis=1)
+        ourShortage = numpy.maximum(self.minCards - (hand.sum(axis=1) - dealtToUs), 0)
+        self.packSize -= dealtToUs * ~dealing
+        drawn = numpy.zeros_like(self.handSizes)
+        for i in range(self.numberOfPlayers):
+            player = (roles[:, 1] - i) % self.numberOfPlayers
+            us = dealing & (player == 0)
+            self.packSize -= dealtToUs * us
+            exhausted = us & (dealtToUs < ourShortage)
+            if numpy.any(exhausted):
+                drewFirst = drawn[exhausted]
+                total = drewFirst.sum(axis=1, keepdims=True)
+                shares = numpy.where(total > 0, drewFirst / numpy.maximum(total, 1e-9), 1 / (self.numberOfPlayers - 1))
+                self.handSizes[exhausted] += shares * self.packSize[exhausted][:, None]
+                self.packSize[exhausted] = 0
+            for opponent in range(1, self.numberOfPlayers):
+                drawing = dealing & (player == opponent)
+                draw = numpy.clip(self.minCards - self.handSizes[:, opponent - 1], 0, self.packSize) * drawing
+                self.handSizes[:, opponent - 1] += draw
+                drawn[:, opponent - 1] += draw
+                self.packSize -= draw
+
+        self.previous = current
+        self.previousRoles = roles
+
+    def _start(self, starting, current, roles):
+        # Everyone starts with a full hand, dealt from a full pack.
+        self.known[starting] = False
+        self.hidden[starting] = ~current[starting][:, [0, 2, 3, 4, 5]].any(axis=1)
+        self.handSizes[starting] = self.minCards
+        self.packSize[starting] = max(52 - self.numberOfPlayers * self.minCards, 0)
+        self.previous[starting] = current[starting]
+        self.previousRoles[starting] = roles[starting]
+        self.initialised[starting] = True
+
+    def _play(self, player, cards):
+        # 'player' (relative, one per batch entry) played this many previously unseen cards.
+        for opponent in range(1, self.numberOfPlayers):
+            self.handSizes[:, opponent - 1] -= cards * (player == opponent)
+
+    def _playByAnyAttacker(self, defender, cards):
+        # Without knowing which attacker played the cards, share them between every opponent who isn't defending.
+        attackers = numpy.arange(1, self.numberOfPlayers)[None, :] != defender[:, None]
+        self.handSizes -= attackers * (cards / numpy.maximum(attackers.sum(axis=1), 1))[:, None]
+
+    def _unknownMass(self):
+        return numpy.maximum(self.handSizes - self.known.sum(axis=2), 0)
+
+    def probabilities(self):
+        # (batch, opponents, 4, 13): the probability each opponent holds each card.
+        hiddenCount = numpy.maximum(self.hidden.sum(axis=1), 1)
+        share = self._unknownMass() / hiddenCount[:, None]
+        probabilities = self.known + self.hidden[:, None, :] * share[:, :, None]
+        return self._unbatch(probabilities.reshape(self.batchSize, -1, 4, 13))
+
+    def packProbabilities(self):
+        # (batch, 4, 13): the probability each card is still in the pack.
+        hiddenCount = numpy.maximum(self.hidden.sum(axis=1), 1)
+        probabilities = self.hidden * (numpy.maximum(self.packSize, 0) / hiddenCount)[:, None]
+        return self._unbatch(probabilities.reshape(self.batchSize, 4, 13))
+
+    def expectedHandSizes(self):
+        return self._unbatch(self.handSizes)
+
+    def expectedPackSize(self):
+        return self._unbatch(self.packSize)
+
+    def _unbatch(self, values):
+        return values if self.batched else values[0]
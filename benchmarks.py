@@ -0,0 +1,317 @@
+import argparse
+import copy
+import cProfile
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+import numpy
+
+from deltas import ActionDeltas
+from durak import playThreaded
+from engines import ArrayEngine, BitboardEngine
+from game import Game, seedStreams
+from player import Player
+from simulation import Scheduler
+
+# Every game is seeded, so two runs of the same revision measure the same games and positions; only the
+# threaded games depend on how their threads happen to be scheduled.
+
+ACTIONS = ['attack', 'defend', 'bounce', 'concede', 'joinAttack', 'declineToAttack', 'done']
+
+
+def timeCalls(calls, repeat):
+    # Each call in turn, 'repeat' times over. The best pass is the least disturbed by everything else going on.
+    passes = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for call in calls:
+            call()
+        passes.append((time.perf_counter() - start) / len(calls))
+    return {'calls': len(calls), 'bestMicroseconds': min(passes) * 1e6,
+            'meanMicroseconds': statistics.mean(passes) * 1e6}
+
+
+def benchmarkGames(numberOfPlayers, games, minCards, maxAttacks, seedValue):
+    # Whole games: threaded, as durak.main plays them, and headless under a Scheduler.
+    results = {}
+    seeds = seedStreams(seedValue, games)
+    start = time.perf_counter()
+    for gameSeed in seeds:
+        playThreaded(numberOfPlayers, minCards, maxAttacks, seed=gameSeed)
+    elapsed = time.perf_counter() - start
+    results['threaded'] = {'games': games, 'seconds': elapsed, 'gamesPerSecond': games / elapsed}
+
+    # The same games on each engine, so the bitboards' speedup over the planes they replaced is measured too.
+    for (name, engine) in [('scheduled', BitboardEngine), ('scheduledArrayEngine', ArrayEngine)]:
+        turns = []
+        start = time.perf_counter()
+        for gameSeed in seeds:
+            game = Game(numberOfPlayers, minCards, maxAttacks, engine=engine, synchronised=False, seed=gameSeed)
+            Scheduler(game, [Player(i, game) for i in range(numberOfPlayers)]).run()
+            turns.append(game.turns)
+        elapsed = time.perf_counter() - start
+        results[name] = {'games': games, 'seconds': elapsed, 'gamesPerSecond': games / elapsed,
+                         'meanTurns': statistics.mean(turns)}
+    results['scheduled']['speedupOverArrayEngine'] = (results['scheduled']['gamesPerSecond']
+                                                      / results['scheduledArrayEngine']['gamesPerSecond'])
+    return results
+
+
+class PositionSampler:
+    # Stands in for Game.step, as records.Recorder does, keeping the position before each move while it still
+    # needs more of that kind.
+    def __init__(self, game, moves, observations, samples):
+        self.game = game
+        self.moves = moves
+        self.observations = observations
+        self.samples = samples
+
+    def step(self, player, action):
+        game = self.game
+        if len(self.moves[action[0]]) < self.samples:
+            self.moves[action[0]].append((copy.deepcopy(game), player, action))
+        if len(self.observations) < self.samples:
+            self.observations.append((game, player, numpy.array(game.getState(player))))
+        game.step(player, action)
+
+
+def collectPositions(numberOfPlayers, minCards, maxAttacks, samples, seedValue, maxGames=50):
+    # Positions from seeded games, with the move that was made in each: up to 'samples' of each kind of action,
+    # and as many player observations. Each kept position is a copy of the whole game, so it can be replayed.
+    moves = defaultdict(list)
+    observations = []
+    for gameSeed in seedStreams(seedValue, maxGames):
+        game = Game(numberOfPlayers, minCards, maxAttacks, synchronised=False, seed=gameSeed)
+        sampler = PositionSampler(game, moves, observations, samples)
+        Scheduler(game, [Player(i, game) for i in range(numberOfPlayers)], sampler).run()
+        if all(len(moves[kind]) >= samples for kind in ACTIONS):
+            break
+    return moves, observations
+
+
+def benchmarkMicro(numberOfPlayers, minCards, maxAttacks, samples, repeat, seedValue):
+    (moves, observations) = collectPositions(numberOfPlayers, minCards, maxAttacks, samples, seedValue)
+    results = {}
+
+    # Observations are snapshots, so a fresh Player (whose hand index is incremental) sees them in order.
+    player = Player(0, observations[0][0])
+    results['Player.getPossibleActions'] = timeCalls(
+        [lambda state=state: player.getPossibleActions(state) for (_, _, state) in observations], repeat)
+
+    # Later positions in the same game are fine for reading from: _playerState doesn't change anything.
+    games = [copy.deepcopy(game) for (game, _, _) in moves['attack']]
+    results['Game._playerState'] = timeCalls(
+        [lambda game=game, p=p: game._playerState(p) for game in games for p in game.activePlayers], repeat)
+
+    # Anything that changes a game needs its own copy for every call, made before the clock starts.
+    def timeMutations(positions, call):
+        passes = []
+        for _ in range(repeat):
+            fresh = [(copy.deepcopy(game), player, action) for (game, player, action) in positions]
+            start = time.perf_counter()
+            for (game, player, action) in fresh:
+                call(game, player, action)
+            passes.append((time.perf_counter() - start) / len(fresh))
+        return {'calls': len(positions), 'bestMicroseconds': min(passes) * 1e6,
+                'meanMicroseconds': statistics.mean(passes) * 1e6}
+
+    # Dealing after each round: the positions just before a concede or a successful defence, once it's played.
+    rounds = []
+    for (game, player, action) in moves['concede'] + moves['defend']:
+        game = copy.deepcopy(game)
+        game.step(player, action)
+        if game.dealt < 52:
+            rounds.append((game, None, None))
+    if rounds:
+        results['Game._pickUpCards'] = timeMutations(rounds, lambda game, player, action: game._pickUpCards())
+
+    # The public methods, as players call them, with the current version so they're never rejected.
+    for kind in ACTIONS:
+        if moves[kind]:
+            results[f'Game.{kind}'] = timeMutations(
+                moves[kind], lambda game, player, action: getattr(game, action[0])(player, game.version, *action[1:]))
+
+    # The same moves as table lookups, made and taken back: one position at a time, then all of them as a batch.
+    deltas = ActionDeltas(numberOfPlayers, maxAttacks)
+    positions = [(numpy.array(game.state), player, deltas.space.encode(action, game.getState(player)))
+                 for kind in ['attack', 'defend', 'bounce', 'joinAttack'] for (game, player, action) in moves[kind]]
+    results['ActionDeltas.apply+undo'] = timeCalls(
+        [lambda state=state, delta=deltas.delta(player, index): (deltas.apply(state, delta), deltas.undo(state, delta))
+         for (state, player, index) in positions], repeat)
+    states = numpy.stack([state for (state, _, _) in positions])
+    players = numpy.array([player for (_, player, _) in positions])
+    indices = numpy.array([index for (_, _, index) in positions])
+    results['ActionDeltas.applyBatch+undoBatch'] = timeCalls(
+        [lambda: (deltas.applyBatch(states, players, indices), deltas.undoBatch(states, players, indices))], repeat)
+    results['ActionDeltas.applyBatch+undoBatch']['states'] = len(states)
+    return results
+
+
+def benchmarkMemory(numberOfPlayers, games, minCards, maxAttacks, seedValue, top=0):
+    # Peak memory allocated while playing each game, from its start to its end.
+    peaks = []
+    tracemalloc.start(25 if top else 1)
+    try:
+        for gameSeed in seedStreams(seedValue, games):
+            tracemalloc.reset_peak()
+            (before, _) = tracemalloc.get_traced_memory()
+            playThreaded(numberOfPlayers, minCards, maxAttacks, seed=gameSeed)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        snapshot = tracemalloc.take_snapshot() if top else None
+    finally:
+        tracemalloc.stop()
+
+    results = {'games': games, 'meanPeakBytes': statistics.mean(peaks), 'maxPeakBytes': max(peaks)}
+    if top:
+        results['retainedAllocations'] = [{'site': str(stat.traceback[0]), 'bytes': stat.size, 'count': stat.count}
+                                     for stat in snapshot.statistics('lineno')[:top]]
+    return results
+
+
+class StackSampler:
+    # Samples the stack of every thread at a fixed interval and counts each distinct stack, written out as
+    # 'outermost;...;innermost count' lines: the folded format flamegraph.pl, inferno and speedscope read.
+    # Threads are sampled whether running or blocked, so it's a wall-clock profile: time spent waiting shows up.
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+def runSuite(args):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'minCards': args.min_cards,
+            'maxAttacks': args.max_attacks,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'games': {},
+        'micro': {},
+        'memory': {},
+    }
+    for numberOfPlayers in args.players:
+        key = str(numberOfPlayers)
+        print(f'{numberOfPlayers} players...', file=sys.stderr)
+        results['games'][key] = benchmarkGames(numberOfPlayers, args.games, args.min_cards, args.max_attacks,
+                                               args.seed)
+        results['micro'][key] = benchmarkMicro(numberOfPlayers, args.min_cards, args.max_attacks, args.samples,
+                                               args.repeat, args.seed)
+        results['memory'][key] = benchmarkMemory(numberOfPlayers, args.memory_games, args.min_cards,
+                                                 args.max_attacks, args.seed, args.tracemalloc)
+    return results
+
+
+def timings(results):
+    # Every timing in a set of results, by a path naming it: higher is better for rates, lower for times.
+    for section in ['games', 'micro']:
+        for players, benchmarks in results.get(section, {}).items():
+            for name, values in benchmarks.items():
+                if 'gamesPerSecond' in values:
+                    yield f'{section}/{players}/{name}', values['gamesPerSecond'], True
+                else:
+                    yield f'{section}/{players}/{name}', values['bestMicroseconds'], False
+
+
+def compare(results, baseline, tolerance):
+    # Prints how every timing moved against the baseline; returns the names of any that got worse than allowed.
+    old = {name: (value, higherIsBetter) for name, value, higherIsBetter in timings(baseline)}
+    regressions = []
+    for name, value, higherIsBetter in timings(results):
+        if name not in old:
+            continue
+        speedup = value / old[name][0] if higherIsBetter else old[name][0] / value
+        flag = ''
+        if speedup < 1 - tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:45} {speedup:6.2f}x{flag}', file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the game engine and players.')
+    parser.add_argument('--players', type=int, nargs='+', default=[2, 3, 4, 5, 6])
+    parser.add_argument('--min-cards', type=int, default=6)
+    parser.add_argument('--max-attacks', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--games', type=int, default=20, help='Games timed for each number of players.')
+    parser.add_argument('--memory-games', type=int, default=5)
+    parser.add_argument('--samples', type=int, default=200, help='Positions timed for each microbenchmark.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None, help='Write the results here as JSON, as well as to stdout.')
+    parser.add_argument('--compare', default=None, help='A previous JSON result to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='How much slower than the comparison anything may get before failing.')
+    parser.add_argument('--profile', default=None, help='Write cProfile statistics for the main thread here.')
+    parser.add_argument('--folded', default=None, help='Write sampled stacks from every thread here, folded.')
+    parser.add_argument('--tracemalloc', type=int, default=0, metavar='N',
+                        help='Also report the N allocation sites still holding the most memory after the games.')
+    args = parser.parse_args()
+
+    profile = cProfile.Profile() if args.profile else None
+    sampler = StackSampler() if args.folded else None
+    if sampler:
+        sampler.__enter__()
+    if profile:
+        profile.enable()
+    try:
+        results = runSuite(args)
+    finally:
+        if profile:
+            profile.disable()
+            profile.dump_stats(args.profile)
+        if sampler:
+            sampler.__exit__()
+            sampler.write(args.folded)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    print(output)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,133 @@
+import asyncio
 import threading
+from collections import deque
 
 
-class OverwritableSlot:
-    def __init__(self):
-        self.value = None
-        self.slotEmpty = MultiReleaseSempahore(down=False)
-        self.slotFull = MultiReleaseSempahore(down=True)
+class UpdateQueue:
+    # A queue of updates from one producer to one consumer, for threads.
+    #
+    # Unbounded by default, so sending never blocks. With a maxsize, a full queue either makes the sender wait
+    # until the consumer catches up (backpressure) or, with dropToLatest, throws away the oldest updates so the
+    # consumer only sees the newest ones; maxsize=1 with dropToLatest just holds the latest update.
+    def __init__(self, maxsize=None, dropToLatest=False):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.dropToLatest = dropToLatest
+        self.dropped = 0
+        self.taken = 0
+        self.condition = threading.Condition()
+
+    def _full(self):
+        return self.maxsize is not None and len(self.items) >= self.maxsize
 
     def send(self, value):
-        self.slotEmpty.acquire()
-        self.value = value
-        self.slotFull.release()
-        self.slotEmpty.release()
+        with self.condition:
+            while self._full():
+                if self.dropToLatest:
+                    self.items.popleft()
+                    self.dropped += 1
+                else:
+                    self.condition.wait()
+            self.items.append(value)
+            self.condition.notify_all()
 
     def receive(self):
-        self.slotFull.acquire()
-        result = self.value
-        return result
+        # Blocks until there is an update, then returns the oldest one.
+        with self.condition:
+            self.condition.wait_for(lambda: self.items)
+            value = self.items.popleft()
+            self.taken = 1
+            self.condition.notify_all()
+            return value
+
+    def receiveAll(self):
+        # Blocks until there is an update, then returns every pending update, oldest first.
+        with self.condition:
+            self.condition.wait_for(lambda: self.items)
+            values = list(self.items)
+            self.items.clear()
+            self.taken = len(values)
+            self.condition.notify_all()
+            return values
+
+    def receiveLatest(self):
+        return self.receiveAll()[-1]
+
+    def outstanding(self):
+        # Updates the consumer may still be using: those waiting for it, and those it took last time, which it's
+        # done with once it comes back for more.
+        with self.condition:
+            return len(self.items) + self.taken
 
+    def __len__(self):
+        return len(self.items)
 
-class MultiReleaseSempahore():
-    def __init__(self, down):
-        self.semaphore = threading.BoundedSemaphore(value=1)
-        # Set the semaphore to the initial value
-        if down:
-            self.semaphore.acquire()
 
-    def release(self):
-        try:
-            self.semaphore.release()
-        except ValueError:
-            # This is fine.
-            pass
+class AsyncUpdateQueue:
+    # The same queue for code running in an asyncio event loop, so one loop can host many games and players.
+    #
+    # A game in an event loop can't stop and wait for a consumer, so 'send' never waits: a full queue drops its
+    # oldest update with dropToLatest, and otherwise raises asyncio.QueueFull. Coroutines producing updates of
+    # their own can 'await put' instead, which waits for space.
+    def __init__(self, maxsize=None, dropToLatest=False):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.dropToLatest = dropToLatest
+        self.dropped = 0
+        self.taken = 0
+        self.nonEmpty = asyncio.Event()
+        self.nonFull = asyncio.Event()
+        self.nonFull.set()
 
-    def acquire(self):
-        self.semaphore.acquire()
+    def _full(self):
+        return self.maxsize is not None and len(self.items) >= self.maxsize
+
+    def _changed(self):
+        if self.items:
+            self.nonEmpty.set()
+        else:
+            self.nonEmpty.clear()
+        if self._full():
+            self.nonFull.clear()
+        else:
+            self.nonFull.set()
+
+    def send(self, value):
+        if self._full():
+            if not self.dropToLatest:
+                raise asyncio.QueueFull
+            self.items.popleft()
+            self.dropped += 1
+        self.items.append(value)
+        self._changed()
 
+    async def put(self, value):
+        while self._full() and not self.dropToLatest:
+            await self.nonFull.wait()
+        self.send(value)
 
+    async def receive(self):
+        while not self.items:
+            await self.nonEmpty.wait()
+        value = self.items.popleft()
+        self.taken = 1
+        self._changed()
+        return value
 
+    async def receiveAll(self):
+        while not self.items:
+            await self.nonEmpty.wait()
+        values = list(self.items)
+        self.items.clear()
+        self.taken = len(values)
+        self._changed()
+        return values
 
+    async def receiveLatest(self):
+        return (await self.receiveAll())[-1]
 
+    def outstanding(self):
+        return len(self.items) + self.taken
 
+    def __len__(self):
+        return len(self.items)
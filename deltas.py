@@ -0,0 +1,130 @@
+from collections import namedtuple
+
+import numpy
+
+from actions import ActionSpace
+
+# The changes actions make to the card planes of a game state, in the layout of Game.state (or of each game in
+# BatchGame.state), looked up rather than worked out: applying an action is a single add, and taking it back a
+# single subtract, for one state or a whole batch of them. Only the cards move; roles, dealing and the end of a
+# round are for the rules to decide.
+
+# Attacks and bounces move up to four cards, each out of one zone and into another.
+WIDTH = 8
+
+# A change to a state: 'signs', each +1 or -1, are added at 'positions' (52 * zone + card) of the state flattened,
+# all of which lie in 'zones'.
+Delta = namedtuple('Delta', ['positions', 'signs', 'zones'])
+
+
+def movesDelta(flat, moves):
+    # The Delta for making moves one after another, from the flattened state 'flat'. Each move is (cards, fromZone,
+    # toZone), with cards as card numbers, or None for whatever the zone still holds by then. No card may be moved
+    # twice.
+    fromPositions = []
+    toPositions = []
+    zones = []
+    movedOut = {}
+    for (cards, fromZone, toZone) in moves:
+        if cards is None:
+            cards = numpy.flatnonzero(flat[52 * fromZone:52 * fromZone + 52])
+            if fromZone in movedOut:
+                cards = numpy.setdiff1d(cards, numpy.concatenate(movedOut[fromZone]), assume_unique=True)
+        else:
+            movedOut.setdefault(fromZone, []).append(cards)
+        fromPositions.append(52 * fromZone + cards)
+        toPositions.append(52 * toZone + cards)
+        zones += [fromZone, toZone]
+    positions = numpy.concatenate(fromPositions + toPositions)
+    signs = numpy.ones(len(positions), dtype=int)
+    signs[:len(positions) // 2] = -1
+    return Delta(positions, signs, tuple(dict.fromkeys(zones)))
+
+
+def flatten(states, batch):
+    # A flat view of one state, or one row per state of a batch, to add deltas to in place.
+    if not states.flags.c_contiguous:
+        raise ValueError('States must be contiguous to be updated in place')
+    return states.reshape((len(states), -1) if batch else -1)
+
+
+class ActionDeltas:
+    # Deltas for every action in an ActionSpace, by acting player and action index. Attacks, defences, bounces and
+    # joined attacks always move the same cards, and declining and waiting move none, so those are precomputed.
+    # Which cards a concession moves depends on what's on the table, so those come from concede().
+    def __init__(self, numberOfPlayers, maxAttacks):
+        self.numberOfPlayers = numberOfPlayers
+        self.space = space = ActionSpace(maxAttacks)
+
+        self.openAttacks = numberOfPlayers + 1
+        self.closedAttacks = numberOfPlayers + 2
+        self.defences = numberOfPlayers + 3
+        self.burned = numberOfPlayers + 4
+        self.pack = numberOfPlayers + 5
+
+        # Every row is padded out to WIDTH with zeros added to distinct places in the pack, which none of these
+        # actions touch: no place appears twice in a row, so a whole batch can be updated by one buffered add.
+        self.positions = numpy.tile(52 * self.pack + numpy.arange(WIDTH), (numberOfPlayers, space.size, 1))
+        self.signs = numpy.zeros((numberOfPlayers, space.size, WIDTH), dtype=int)
+        self.counts = numpy.zeros(space.size, dtype=int)
+        self.zones = [[()] * space.size for _ in range(numberOfPlayers)]
+        self.conceding = numpy.zeros(space.size, dtype=bool)
+        self.conceding[space.concede:space.join] = True
+
+        cards = numpy.arange(52)[:, None]
+        (defending, attacking) = numpy.divmod(numpy.arange(52 * 52)[:, None], 52)
+        for player in range(numberOfPlayers):
+            for base in [space.attack, space.bounce]:
+                for subset, subsetCards in enumerate(space.subsetCards):
+                    self._set(player, base + subset, [(numpy.flatnonzero(subsetCards), player, self.openAttacks)])
+            self._set(player, space.join + cards[:, 0], [(cards, player, self.openAttacks)])
+            self._set(player, space.defend + numpy.arange(52 * 52),
+                      [(defending, player, self.defences), (attacking, self.openAttacks, self.closedAttacks)])
+
+    def _set(self, player, indices, moves):
+        # Each move is (cards, fromZone, toZone), with the cards it moves for each index along the last axis.
+        positions = numpy.concatenate([numpy.concatenate([52 * fromZone + cards, 52 * toZone + cards], axis=-1)
+                                       for (cards, fromZone, toZone) in moves], axis=-1)
+        count = positions.shape[-1]
+        self.positions[player, indices, :count] = positions
+        self.signs[player, indices, :count] = numpy.concatenate([numpy.repeat([-1, 1], cards.shape[-1])
+                                                                 for (cards, _, _) in moves])
+        self.counts[indices] = count
+        zones = tuple(dict.fromkeys(zone for (_, fromZone, toZone) in moves for zone in (fromZone, toZone)))
+        for index in numpy.atleast_1d(indices).tolist():
+            self.zones[player][index] = zones
+
+    def delta(self, player, index):
+        if self.conceding[index]:
+            raise ValueError('What a concession moves depends on the table: use concede()')
+        count = self.counts[index]
+        return Delta(self.positions[player, index, :count], self.signs[player, index, :count],
+                     self.zones[player][index])
+
+    def concede(self, state, player, index):
+        # The Delta for conceding, as the ActionSpace numbers it, in this state: the player picks up the closed
+        # attacks, defences and chosen open attacks, and the rest of the open attacks are burned.
+        flat = flatten(state, False)
+        openAttacks = numpy.flatnonzero(flat[52 * self.openAttacks:52 * self.openAttacks + 52])
+        conceded = openAttacks[self.space.concedePositions[index - self.space.concede][:len(openAttacks)]]
+        return movesDelta(flat, [(None, self.closedAttacks, player), (None, self.defences, player),
+                                 (conceded, self.openAttacks, player), (None, self.openAttacks, self.burned)])
+
+    def apply(self, state, delta):
+        flatten(state, False)[delta.positions] += delta.signs
+
+    def undo(self, state, delta):
+        flatten(state, False)[delta.positions] -= delta.signs
+
+    def applyBatch(self, states, players, indices, sign=1):
+        # Applies an action to each state of a batch: one gather of its deltas and one add. 'players' may be one
+        # player for every state. Concessions can't be batched.
+        indices = numpy.asarray(indices)
+        if numpy.any(self.conceding[indices]):
+            raise ValueError('What a concession moves depends on the table: use concede()')
+        players = numpy.broadcast_to(players, indices.shape)
+        flat = flatten(states, True)
+        flat[numpy.arange(len(flat))[:, None], self.positions[players, indices]] += sign * self.signs[players, indices]
+
+    def undoBatch(self, states, players, indices):
+        self.applyBatch(states, players, indices, -1)
@@ -1,14 +1,16 @@
+import argparse
+import json
 import threading
 
+from events import PrintSink
 from game import Game
+from metrics import GameMetrics
 from player import Player
+from selfplay import runGames, runGamesConcurrently, summarise
 
 
-def main():
-    numberOfPlayers = 4
-    minCards = 6
-    maxAttacks = 5
-    game = Game(numberOfPlayers, minCards, maxAttacks)
+def playThreaded(numberOfPlayers, minCards, maxAttacks, sink=None, metrics=None, seed=None):
+    game = Game(numberOfPlayers, minCards, maxAttacks, sink=sink, metrics=metrics, seed=seed)
     players = [Player(i, game) for i in range(numberOfPlayers)]
 
     threads = [threading.Thread(target=(lambda p: p.play()), args=(players[i],)) for i in range(numberOfPlayers)]
@@ -16,6 +18,41 @@ def main():
         thread.start()
     for thread in threads:
         thread.join()
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play Durak.')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--min-cards', type=int, default=6)
+    parser.add_argument('--max-attacks', type=int, default=5)
+    parser.add_argument('--games', type=int, default=None,
+                        help='Play this many headless self-play games across a pool of workers and print a summary. '
+                             'Without this, a single threaded game is played with commentary.')
+    parser.add_argument('--workers', type=int, default=None, help='Defaults to the number of CPUs.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Play exactly the same games again: the deals and every random choice the players make.')
+    parser.add_argument('--games-per-task', type=int, default=10)
+    parser.add_argument('--metrics', action='store_true',
+                        help='After a threaded game, print its lock, rejection and update latency statistics.')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='Host all the games in a single asyncio event loop instead of a pool of workers.')
+    args = parser.parse_args()
+
+    if args.games is None:
+        metrics = GameMetrics(args.players) if args.metrics else None
+        playThreaded(args.players, args.min_cards, args.max_attacks, sink=PrintSink(), metrics=metrics,
+                     seed=args.seed)
+        if metrics is not None:
+            print(json.dumps(metrics.snapshot(), indent=2))
+    elif args.asyncio:
+        results = runGamesConcurrently(args.players, args.min_cards, args.max_attacks, args.games, seed=args.seed)
+        print(json.dumps(summarise(results, args.players), indent=2))
+    else:
+        results = runGames(args.players, args.min_cards, args.max_attacks, args.games,
+                           workers=args.workers, seed=args.seed, gamesPerTask=args.games_per_task)
+        print(json.dumps(summarise(results, args.players), indent=2))
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import os
+from collections import OrderedDict
+
+import numpy
+
+from engines import FULL, SUIT, popcount
+from mcts import informationSet
+from player import Player
+from simulator import Simulator, actionToMove
+
+
+def canonicalKey(simulator, player):
+    # A two-player position, from the point of view of the player to move, under its rules: maxAttacks decides
+    # which moves there are. Burned cards can never come back, so are left out; and since the non-trump suits are
+    # interchangeable, they're sorted, so positions that only differ by a permutation of those suits share a key.
+    other = simulator.activePlayers[0] if simulator.activePlayers[1] == player else simulator.activePlayers[1]
+    zones = (simulator.hands[player], simulator.hands[other], simulator.openAttacks, simulator.closedAttacks,
+             simulator.defences)
+    suits = [tuple((zone >> (13 * suit)) & SUIT for zone in zones) for suit in range(4)]
+    trumps = suits.pop(simulator.trumpSuit)
+    declined = simulator.declinedToAttack
+    return (simulator.maxAttacks, trumps, *sorted(suits), player == simulator.attacker, declined[player],
+            declined[other])
+
+
+def _keyRow(key, value):
+    # A key and its value as one row of integers, for saving.
+    (maxAttacks, *suits, attacking, declined, otherDeclined) = key
+    return [maxAttacks, *[zone for suit in suits for zone in suit], attacking, declined, otherDeclined, value]
+
+
+def _rowKey(row):
+    suits = [tuple(row[start:start + 5]) for start in range(1, 21, 5)]
+    return (row[0], *suits, bool(row[21]), bool(row[22]), bool(row[23])), row[24]
+
+
+class TranspositionTable:
+    # Solved positions, by canonical key, least recently used first. Once it holds 'size' positions the least
+    # recently used are forgotten. With a path, it starts from whatever was last saved there. Saved tables are
+    # plain arrays of integers, a row per position, so loading one never runs anything in it.
+    def __init__(self, size=1000000, path=None):
+        self.entries = OrderedDict()
+        self.size = size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, path):
+        with open(path, 'rb') as file:
+            rows = numpy.load(file, allow_pickle=False)
+        self.entries.update(_rowKey(row) for row in rows.tolist())
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def save(self, path=None):
+        # Written to one side first, so an interrupted save can't spoil an existing cache.
+        path = self.path if path is None else path
+        rows = numpy.array([_keyRow(key, value) for key, value in self.entries.items()], dtype=numpy.int64)
+        with open(path + '.tmp', 'wb') as file:
+            numpy.save(file, rows.reshape(-1, 25), allow_pickle=False)
+        os.replace(path + '.tmp', path)
+
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Moves worth trying first: cheap ones before expensive ones, and giving in last.
+ORDER = {'attack': 0, 'defend': 1, 'joinAttack': 2, 'declineToAttack': 3, 'bounce': 4, 'concede': 5}
+
+
+def moveOrder(move, trumpSuit):
+    cards = move[1] if len(move) > 1 else 0
+    lowest = (cards & -cards).bit_length() - 1 if move[0] not in ('defend', 'joinAttack') else cards
+    return ORDER[move[0]], lowest // 13 == trumpSuit, lowest % 13
+
+
+class Unsolved(Exception):
+    pass
+
+
+class EndgameSolver:
+    # Exact play for two players once the pack is empty, when both hands are known. Conceding and bouncing can
+    # bring a position round again, and a game that can go round forever is a draw: neither player can force
+    # the other to lose. Results are WIN, DRAW or LOSS for the player to move, and the search stops at the first
+    # winning move it finds.
+    #
+    # Lines longer than maxDepth moves are treated like going round, so a WIN or LOSS is always exact but a
+    # draw only means that neither player can be shown to force a win. Searching more than maxPositions new
+    # positions for one question gives up with Unsolved; everything solved up to then stays in the table.
+    def __init__(self, table=None, maxPositions=50000, maxDepth=200):
+        self.table = TranspositionTable() if table is None else table
+        self.maxPositions = maxPositions
+        self.maxDepth = maxDepth
+        self.positions = 0
+        self.budget = 0
+        self.path = set()
+
+    def loser(self, simulator):
+        # Who loses from here if both players play perfectly, or None if it's a draw. The simulator is left as it
+        # was found.
+        self.budget = self.positions + self.maxPositions
+        try:
+            return self._solve(simulator)[0]
+        finally:
+            self.path.clear()
+
+    def _solve(self, simulator):
+        # The loser, and whether that depends on the positions on the way here. A draw that comes from going
+        # round to a position further up the path might not be a draw from elsewhere, so isn't remembered; wins
+        # and losses never rest on such a draw.
+        turn = simulator.nextMover()
+        if turn is None:
+            return simulator.loser(), False
+        (player, moves) = turn
+        other = simulator.activePlayers[0] if simulator.activePlayers[1] == player else simulator.activePlayers[1]
+        key = canonicalKey(simulator, player)
+        result = self.table.get(key)
+        if result is None:
+            if key in self.path or len(self.path) >= self.maxDepth:
+                return None, True
+            self.positions += 1
+            if self.positions > self.budget:
+                raise Unsolved
+            self.path.add(key)
+            result = LOSS
+            dependent = False
+            for move in sorted(moves, key=lambda move: moveOrder(move, simulator.trumpSuit)):
+                undo = simulator.make(player, move)
+                (loser, fromPath) = self._solve(simulator)
+                simulator.undo(undo)
+                if loser == other:
+                    result = WIN
+                    break
+                elif loser is None:
+                    result = DRAW
+                    dependent |= fromPath
+            self.path.remove(key)
+            if result != DRAW or not dependent:
+                self.table.put(key, result)
+            elif result == DRAW:
+                return None, True
+        return {WIN: other, DRAW: None, LOSS: player}[result], False
+
+    def winningMove(self, simulator, player):
+        # A move that wins for 'player', who's about to move, or None if none does or the search gives up.
+        simulator = simulator.clone()
+        turn = simulator.nextMover()
+        if turn is None or turn[0] != player:
+            return None
+        try:
+            for move in sorted(turn[1], key=lambda move: moveOrder(move, simulator.trumpSuit)):
+                undo = simulator.make(player, move)
+                loser = self.loser(simulator)
+                simulator.undo(undo)
+                if loser is not None and loser != player:
+                    return move
+        except Unsolved:
+            pass
+        return None
+
+
+def endgameSimulator(player, state, beliefs, numberOfPlayers, minCards, maxAttacks):
+    # The position as a Simulator if, as far as the player can tell, the pack is empty and only one opponent has
+    # any cards: then that opponent must hold every card the player can't see. Otherwise None.
+    view = informationSet(player, state, beliefs, numberOfPlayers, minCards, maxAttacks)
+    unseen = FULL & ~(view.hand | view.openAttacks | view.closedAttacks | view.defences | view.burned)
+    sizes = [round(size) for size in view.handSizes]
+    holders = [opponent for opponent, size in enumerate(sizes, 1) if size > 0]
+    if len(holders) != 1 or sizes[holders[0] - 1] != popcount(unseen):
+        return None
+    opponent = (player + holders[0]) % numberOfPlayers
+    if {view.attacker, view.defender} != {player, opponent}:
+        return None
+
+    hands = [0] * numberOfPlayers
+    hands[player] = view.hand
+    hands[opponent] = unseen
+    return Simulator(numberOfPlayers, minCards, maxAttacks, view.trumpSuit, hands, [], view.attacker, view.defender,
+                     sorted([player, opponent]), player, view.openAttacks, view.closedAttacks, view.defences,
+                     view.burned)
+
+
+class EndgamePlayer(Player):
+    # Plays a winning move whenever the position is a solvable endgame and there is one; otherwise leaves the
+    # choice to 'fallback' (a function from state to action), or chooses at random.
+    def __init__(self, name, game, solver=None, fallback=None, seed=None):
+        super().__init__(name, game, trackBeliefs=True, seed=seed)
+        self.solver = EndgameSolver() if solver is None else solver
+        self.fallback = self.sampleAction if fallback is None else fallback
+
+    def chooseAction(self, state):
+        actions = self.getPossibleActions(state)
+        if len(actions) == 1:
+            return actions[0]
+        game = self.game
+        simulator = endgameSimulator(self.name, state, self.beliefs, game.numberOfPlayers, game.minCards,
+                                     game.maxAttacks)
+        if simulator is not None:
+            move = self.solver.winningMove(simulator, self.name)
+            legal = {actionToMove(action): action for action in actions}
+            if move in legal:
+                return legal[move]
+        return self.fallback(state)
@@ -0,0 +1,197 @@
+import numpy
+
+# Cards are indexed as 13 * suit + value, matching the row-major layout of a 4x13 plane.
+BITS = numpy.left_shift(numpy.uint64(1), numpy.arange(52, dtype=numpy.uint64))
+FULL = (1 << 52) - 1
+# Each card number's suit and value, to look up rather than divide.
+(SUITS, VALUES) = numpy.divmod(numpy.arange(52), 13)
+SUIT = (1 << 13) - 1
+# Weights that turn a flattened plane into its mask, and a plane's values into a values mask.
+CARD_WEIGHTS = numpy.left_shift(1, numpy.arange(52, dtype=numpy.int64))
+VALUE_WEIGHTS = numpy.left_shift(1, numpy.arange(13, dtype=numpy.int64))
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+
+
+def cardsMask(cards):
+    # Cards either as card numbers, one or a sequence of them, or as a (suits, values) pair, as numpy.where gives
+    # them for a 4x13 plane. A tuple is always taken to be (suits, values).
+    if isinstance(cards, tuple):
+        (suits, values) = cards
+        if isinstance(suits, (int, numpy.integer)):
+            return 1 << (13 * int(suits) + int(values))
+        if isinstance(suits, numpy.ndarray):
+            cards = (13 * suits + values).tolist()
+        else:
+            cards = [13 * int(suit) + int(value) for suit, value in zip(suits, values)]
+    elif isinstance(cards, (int, numpy.integer)):
+        return 1 << int(cards)
+    elif isinstance(cards, numpy.ndarray):
+        cards = cards.tolist()
+    mask = 0
+    for card in cards:
+        mask |= 1 << int(card)
+    return mask
+
+
+def valuesMask(mask):
+    # The values of the cards in a mask, as a 13-bit mask, whatever their suits.
+    return (mask | mask >> 13 | mask >> 26 | mask >> 39) & SUIT
+
+
+def maskIndices(mask):
+    indices = []
+    while mask:
+        lowest = mask & -mask
+        indices.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return indices
+
+
+def maskCards(mask):
+    # Same ordering as numpy.where on a 4x13 plane: by suit, then by value.
+    indices = numpy.array(maskIndices(mask), dtype=numpy.intp)
+    return (SUITS[indices], VALUES[indices])
+
+
+class ArrayEngine:
+    # The original representation: one 4x13 one-hot plane per zone.
+    def __init__(self, numberOfZones):
+        self.state = numpy.zeros((numberOfZones, 4, 13), dtype=int)
+        # Zones modified since the game last collected them, so observers only need to refresh these.
+        self.changed = set()
+
+    def array(self):
+        return self.state.copy()
+
+    def fill(self, zone):
+        self.state[zone] = numpy.ones((4, 13), dtype=int)
+        self.changed.add(zone)
+
+    def fillSuit(self, zone, suit):
+        self.state[zone][suit] = numpy.ones(13, dtype=int)
+        self.changed.add(zone)
+
+    def getCards(self, zone):
+        return numpy.where(self.state[zone] == 1)
+
+    def mask(self, zone):
+        return int(self.state[zone].reshape(52) @ CARD_WEIGHTS)
+
+    def valuesIn(self, zones):
+        # The values of every card in any of these zones, as a 13-bit mask.
+        return int(self.state[zones].any(axis=(0, 1)) @ VALUE_WEIGHTS)
+
+    def numberOfCards(self, zone):
+        return numpy.sum(self.state[zone])
+
+    def hasCard(self, zone, card):
+        return self.state[zone][card] == 1
+
+    def hasCards(self, zone, cards):
+        return numpy.all(self.state[zone][cards] == 1)
+
+    def moveCards(self, cards, fromZone, toZone):
+        self.state[fromZone][cards] = 0
+        self.state[toZone][cards] = 1
+        self.changed.update((fromZone, toZone))
+
+    def moveAll(self, fromZone, toZone):
+        # Whole planes at once: no card is ever in two zones, so adding one to the other is the same as moving.
+        self.state[toZone] += self.state[fromZone]
+        self.state[fromZone] = 0
+        self.changed.update((fromZone, toZone))
+
+    def observe(self, zones):
+        return self.state[zones]
+
+    def observeInto(self, zones, rows, out):
+        out[rows] = self.state[zones]
+
+
+class BitboardEngine:
+    # Each zone is a 52-bit integer mask: counts are popcounts, moves are single AND/OR operations and the rules'
+    # questions about values are a few shifts. Players still see 4x13 planes, so each zone's plane is kept too,
+    # but only converted from its mask when someone next looks at it after it's changed: once per change, however
+    # many players see that zone.
+    #
+    # That conversion, and everything Player does with numpy planes, costs the same under either engine, so
+    # through the observation interface whole games are only 1.1-1.4x faster with bitboards; nothing like 10x is
+    # possible without the players working on masks too, as Simulator and MCTSPlayer do.
+    def __init__(self, numberOfZones):
+        self.zones = [0] * numberOfZones
+        self.changed = set()
+        self.planes = numpy.zeros((numberOfZones, 4, 13), dtype=int)
+        self.unconverted = set()
+
+    def _convert(self, zones):
+        if not self.unconverted:
+            return
+        stale = [zone for zone in zones if zone in self.unconverted]
+        if stale:
+            masks = numpy.array([self.zones[zone] for zone in stale], dtype=numpy.uint64)
+            self.planes[stale] = ((masks[:, None] & BITS) != 0).reshape(-1, 4, 13)
+            self.unconverted.difference_update(stale)
+
+    def array(self):
+        self._convert(range(len(self.zones)))
+        return self.planes.copy()
+
+    def fill(self, zone):
+        self.zones[zone] = FULL
+        self.changed.add(zone)
+        self.unconverted.add(zone)
+
+    def fillSuit(self, zone, suit):
+        self.zones[zone] |= SUIT << (13 * suit)
+        self.changed.add(zone)
+        self.unconverted.add(zone)
+
+    def getCards(self, zone):
+        return maskCards(self.zones[zone])
+
+    def mask(self, zone):
+        return self.zones[zone]
+
+    def valuesIn(self, zones):
+        mask = 0
+        for zone in zones:
+            mask |= self.zones[zone]
+        return valuesMask(mask)
+
+    def numberOfCards(self, zone):
+        return popcount(self.zones[zone])
+
+    def hasCard(self, zone, card):
+        return bool(self.zones[zone] & cardsMask(card))
+
+    def hasCards(self, zone, cards):
+        mask = cardsMask(cards)
+        return self.zones[zone] & mask == mask
+
+    def moveCards(self, cards, fromZone, toZone):
+        mask = cardsMask(cards)
+        self.zones[fromZone] &= ~mask
+        self.zones[toZone] |= mask
+        self.changed.update((fromZone, toZone))
+        self.unconverted.update((fromZone, toZone))
+
+    def moveAll(self, fromZone, toZone):
+        self.zones[toZone] |= self.zones[fromZone]
+        self.zones[fromZone] = 0
+        self.changed.update((fromZone, toZone))
+        self.unconverted.update((fromZone, toZone))
+
+    def observe(self, zones):
+        self._convert(zones)
+        return self.planes[zones]
+
+    def observeInto(self, zones, rows, out):
+        self._convert(zones)
+        out[rows] = self.planes[zones]
@@ -0,0 +1,124 @@
+import json
+from collections import deque, namedtuple
+
+import numpy
+
+printSuit = ['S', 'C', 'H', 'D']
+printValue = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+
+
+def printState(state):
+    print(state)
+    print()
+
+
+def printCard(card):
+    return f'{printValue[card[1]]}{printSuit[card[0]]}'
+
+
+def printCards(cards):
+    cards = numpy.array(cards).T
+    return ', '.join([printCard(card) for card in cards])
+
+
+def cardIndices(cards):
+    # Either a single (suit, value) card or a (suits, values) collection of cards, as card numbers 13 * suit + value.
+    (suits, values) = cards
+    return (13 * numpy.asarray(suits, dtype=int) + numpy.asarray(values, dtype=int)).ravel().tolist()
+
+
+# Cards are kept exactly as the game passed them and only formatted if a sink wants them formatted.
+# 'detail' carries the trump suit for 'start' events and the rejected action for 'reject' events.
+Event = namedtuple('Event', ['kind', 'turn', 'player', 'cards', 'attackingCard', 'detail'],
+                   defaults=(None, None, None, None))
+
+
+class NullSink:
+    # Game checks 'enabled' before building any event, so a disabled sink costs nothing.
+    enabled = False
+    wantsState = False
+
+    def record(self, event):
+        pass
+
+    def recordState(self, turn, state):
+        pass
+
+
+class RingBufferSink(NullSink):
+    # Keeps the most recent events in memory.
+    enabled = True
+
+    def __init__(self, size=10000):
+        self.events = deque(maxlen=size)
+
+    def record(self, event):
+        self.events.append(event)
+
+
+class JsonlSink(NullSink):
+    # One compact JSON object per line, with cards as card numbers.
+    enabled = True
+
+    def __init__(self, file):
+        self.file = open(file, 'w') if isinstance(file, str) else file
+
+    def record(self, event):
+        entry = {'kind': event.kind, 'turn': event.turn}
+        if event.player is not None:
+            entry['player'] = int(event.player)
+        if event.cards is not None:
+            entry['cards'] = cardIndices(event.cards)
+        if event.attackingCard is not None:
+            entry['attackingCard'] = cardIndices(event.attackingCard)[0]
+        if event.detail is not None:
+            entry['detail'] = event.detail
+        self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class PrintSink(NullSink):
+    # The human-readable commentary the game has always printed.
+    enabled = True
+
+    def __init__(self, showState=True):
+        self.wantsState = showState
+
+    def record(self, event):
+        print(self.format(event))
+
+    def recordState(self, turn, state):
+        print(f'\nGame state:\n')
+        printState(state)
+
+    def format(self, event):
+        player = event.player
+        if event.kind == 'start':
+            return f'\nTrumps are {printSuit[event.detail]}.'
+        elif event.kind == 'deal':
+            return f'Player {player} picks up {printCards(event.cards)}.'
+        elif event.kind == 'attack':
+            return f'Player {player} attacks with {printCards(event.cards)}...'
+        elif event.kind == 'join':
+            return f'Player {player} joins attacks: attacks with {printCard(event.cards)}...'
+        elif event.kind == 'defend':
+            return f'Player {player} defends {printCard(event.attackingCard)} with {printCard(event.cards)}...'
+        elif event.kind == 'bounce':
+            return f'Player {player} bounces with {printCards(event.cards)}...'
+        elif event.kind == 'concede':
+            return f'Player {player} concedes...'
+        elif event.kind == 'decline':
+            return f'Player {player} declines to attack...'
+        elif event.kind == 'burn':
+            if player is None:
+                return f'Burned {printCards(event.cards)}.'
+            return f'Successful defence by player {player}!'
+        elif event.kind == 'reject':
+            return f'Player {player} {event.detail} based on old information - reject this action.'
+        elif event.kind == 'out':
+            return f'Player {player} is out!'
+        elif event.kind == 'loss':
+            return f'Player {player} loses after {event.turn} turns!'
+        return str(event)
@@ -1,53 +1,111 @@
-import copy
+import contextlib
 import random
 import threading
+import time
+from collections import namedtuple
 
 import numpy
 
-from communication import OverwritableSlot
-
-printSuit = ['S', 'C', 'H', 'D']
-printValue = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+from communication import AsyncUpdateQueue, UpdateQueue
+from engines import ArrayEngine, cardsMask, maskCards, popcount, valuesMask
+from events import Event, NullSink, printCard, printCards, printState, printSuit, printValue
+from metrics import TimedLock
 
 
 def length(cards):
-    return cards[0].size
+    return numpy.size(cards[0])
 
 
 def constantMatrix(value, rows, columns):
     return numpy.full((rows, columns), value, dtype=int)
 
 
-def printState(state):
-    print(state)
-    print()
+def getCards(state, category):
+    return numpy.where(state[category] == 1)
 
 
-def printCard(card):
-    return f'{printValue[card[1]]}{printSuit[card[0]]}'
+def numberOfCards(state, category):
+    return numpy.sum(state[category])
 
 
-def printCards(cards):
-    cards = numpy.array(cards).T
-    return ', '.join([printCard(card) for card in cards])
+def seedSequence(seed):
+    # A seed can be anything numpy.random.SeedSequence takes (None for fresh entropy), or a SeedSequence already.
+    return seed if isinstance(seed, numpy.random.SeedSequence) else numpy.random.SeedSequence(seed)
 
 
-def getCards(state, category):
-    return numpy.where(state[category] == 1)
+def seedStream(seed, stream):
+    # One of the independent streams SeedSequence.spawn makes from a seed, by number. Unlike spawning, asking for
+    # the same one twice gives the same stream.
+    seed = seedSequence(seed)
+    return numpy.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (stream,), pool_size=seed.pool_size)
 
 
-def numberOfCards(state, category):
-    return numpy.sum(state[category])
+def seedStreams(seed, count):
+    seed = seedSequence(seed)
+    return [seedStream(seed, stream) for stream in range(count)]
+
+
+def pythonRandom(seed):
+    # A random.Random of its own, for drawing a number at a time quickly, seeded from a SeedSequence stream.
+    return random.Random(int(seedSequence(seed).generate_state(1, numpy.uint64)[0]))
+
+
+# Everything chance decides before a game starts: the trump suit, who attacks first, and the order of the deck,
+# as card numbers 13 * suit + value, dealt from the front.
+Deal = namedtuple('Deal', ['trumps', 'attacker', 'deck'])
+
+
+def randomDeal(numberOfPlayers, rng, trumps=None, attacker=None, deck=None):
+    # Whatever isn't given is drawn from the numpy Generator 'rng', always in the same order. Whatever is given
+    # has to make a real deal: anything else would quietly corrupt the game.
+    trumps = int(rng.integers(4)) if trumps is None else trumps
+    deck = rng.permutation(52) if deck is None else numpy.array(deck, dtype=int)
+    attacker = int(rng.integers(numberOfPlayers)) if attacker is None else attacker
+    if not 0 <= trumps < 4:
+        raise ValueError(f'Trumps must be a suit from 0 to 3, not {trumps}')
+    if not 0 <= attacker < numberOfPlayers:
+        raise ValueError(f'The first attacker must be a player from 0 to {numberOfPlayers - 1}, not {attacker}')
+    if deck.shape != (52,) or not numpy.array_equal(numpy.sort(deck), numpy.arange(52)):
+        raise ValueError('The deck must hold every card number from 0 to 51 exactly once')
+    return Deal(trumps, attacker, deck)
+
+
+def dealFromSeed(numberOfPlayers, seed):
+    # The deal Game(numberOfPlayers, ..., seed=seed) makes, worked out ahead of time: to share between games, or
+    # to pass to a Game as trumps, attacker and deck.
+    return randomDeal(numberOfPlayers, numpy.random.default_rng(seedStream(seed, 0)))
 
 
 class Game:
-    def __init__(self, numberOfPlayers, minCards, maxAttacks):
+    def __init__(self, numberOfPlayers, minCards, maxAttacks, engine=ArrayEngine, synchronised=True,
+                 observationBuffers=8, sink=None, trumps=None, attacker=None, deck=None, channel=None, metrics=None,
+                 seed=None):
         self.numberOfPlayers = numberOfPlayers
         self.minCards = minCards
         self.maxAttacks = maxAttacks
 
-        self.lock = threading.Lock()
-        self.toPlayers = [OverwritableSlot() for _ in range(numberOfPlayers)]
+        # Chance comes from streams spawned from the seed: the first deals, and the rest are for the players in
+        # each seat, who take theirs unless given a seed of their own. Nothing is shared with other games or the
+        # global random modules, so games can run side by side and any of them can be played again exactly.
+        (dealing, *self.playerSeeds) = seedStreams(seed, numberOfPlayers + 1)
+        self.rng = numpy.random.default_rng(dealing)
+
+        # A synchronised game is shared by player threads behind a lock. An unsynchronised game is only ever used
+        # by one thread at a time: either driven through 'step', with no channels, or from an asyncio event loop
+        # with channel=AsyncUpdateQueue.
+        self.synchronised = synchronised
+        self.lock = threading.Lock() if synchronised else contextlib.nullcontext()
+        # Optional GameMetrics: lock timings, accepted and rejected actions, and how long updates take to arrive.
+        self.metrics = metrics
+        if metrics is not None and synchronised:
+            self.lock = TimedLock(self.lock, metrics)
+        if channel is None and synchronised:
+            channel = UpdateQueue
+
+        # Players are sent an update whenever something they can see changes, and never miss one however far behind
+        # they fall, so beliefs built up from one observation to the next stay right. Only observers drop updates.
+        self.toPlayers = None if channel is None else [channel() for _ in range(numberOfPlayers)]
+        self.observers = []
 
         self.trumps = self.numberOfPlayers + 0
         self.openAttacks = self.numberOfPlayers + 1
@@ -58,6 +116,7 @@ class Game:
 
         self.numberOfGlobalComponents = 6
         self.numberOfActionComponents = 4
+        self.sharedZones = [self.trumps, self.openAttacks, self.closedAttacks, self.defences, self.burned]
 
         self.attacker = None
         self.defender = None
@@ -66,27 +125,111 @@ class Game:
         self.activePlayers = list(range(self.numberOfPlayers))
 
         self.turns = 0
-        self._initialiseState()
-
-    def _initialiseState(self):
-        self.state = numpy.zeros((self.numberOfPlayers + self.numberOfGlobalComponents, 4, 13), dtype=int)
-
-        trumps = random.randrange(4)
-        self.state[self.trumps][trumps] = numpy.ones(13, dtype=int)
-        self.state[self.pack] = numpy.ones((4, 13), dtype=int)
-
-        self.attacker = random.randrange(self.numberOfPlayers)
+        self.version = 0
+        self.pickedUp = [0 for _ in range(self.numberOfPlayers)]
+
+        # Observations are handed out as read-only views of a ring of buffers per player. A buffer is reused once
+        # the player is done with it, having come back to its queue for newer updates, so a player must not hold
+        # on to an observation past that. A player too far behind for the ring gets a bigger one instead.
+        # Each buffer only has the rows rewritten whose zones have changed since it was last filled.
+        self.observations = [
+            [numpy.zeros((8, 4, 13), dtype=int) for _ in range(observationBuffers)]
+            for _ in range(self.numberOfPlayers)]
+        self.observationVersions = [[-1] * observationBuffers for _ in range(self.numberOfPlayers)]
+        self.latestObservations = [(-1, -1)] * self.numberOfPlayers
+        self.zoneVersions = [0] * (self.numberOfPlayers + self.numberOfGlobalComponents)
+        self.roles = None
+        self.rolesVersion = 0
+        self.sentVersions = [-1] * self.numberOfPlayers
+
+        # Everything that happens is reported to the sink, but only if it's enabled: silent games skip it entirely.
+        self.sink = NullSink() if sink is None else sink
+        self.logging = self.sink.enabled
+
+        self.engineType = engine
+        self._initialiseState(trumps, attacker, deck)
+
+    @property
+    def state(self):
+        # A snapshot of every zone as 4x13 planes, new each time under either engine: changing it doesn't change
+        # the game, and the game carrying on doesn't change it.
+        return self.engine.array()
+
+    def _initialiseState(self, trumps=None, attacker=None, deck=None):
+        # Anything not given is chosen at random. The deck is shuffled once, as card numbers 13 * suit + value,
+        # and cards are dealt from the front of it; so trumps, attacker and deck are enough to replay a game.
+        self.engine = self.engineType(self.numberOfPlayers + self.numberOfGlobalComponents)
+
+        (self.trumpSuit, self.firstAttacker, self.deck) = randomDeal(self.numberOfPlayers, self.rng, trumps, attacker,
+                                                                     deck)
+        self.engine.fillSuit(self.trumps, self.trumpSuit)
+        self.engine.fill(self.pack)
+        self.dealt = 0
+
+        self.attacker = self.firstAttacker
         self.defender = (self.attacker + 1) % self.numberOfPlayers
 
-        print(f'\nTrumps are {printSuit[trumps]}.')
+        if self.logging:
+            self._record('start', self.attacker, detail=self.trumpSuit)
         self._pickUpCards()
 
     def _updatePlayers(self):
-        print(f'\nGame state:\n')
-        printState(self.state)
+        if self.sink.wantsState:
+            self.sink.recordState(self.turns, self.state)
+        self.version += 1
+        for zone in self.engine.changed:
+            self.zoneVersions[zone] = self.version
+        self.engine.changed.clear()
+        if self.roles != (self.attacker, self.defender):
+            self.roles = (self.attacker, self.defender)
+            self.rolesVersion = self.version
+
+        # Only players who can see something new are told about it; the rest carry on as they were.
         for player in self.activePlayers:
-            self.declinedToAttack[player] = False
-            self.toPlayers[player].send(copy.deepcopy(self._playerState(player)))
+            if self._lastChange(player) > self.sentVersions[player]:
+                self.sentVersions[player] = self.version
+                self.declinedToAttack[player] = False
+                if self.toPlayers is not None:
+                    if self.metrics is not None:
+                        self.metrics.send(player, self.version)
+                    self.toPlayers[player].send((self.version, self._observe(player)))
+
+        for observer in self.observers:
+            observer.send((self.version, self.state))
+
+    def _lastChange(self, player):
+        # The last version in which anything this player can see changed.
+        zoneVersions = self.zoneVersions
+        return max(self.rolesVersion, zoneVersions[player], *[zoneVersions[zone] for zone in self.sharedZones])
+
+    def _observe(self, player):
+        # The same observation as _playerState, but filled in place and read-only. A new buffer from the ring is
+        # only used when the player's view has changed since the last one it was given.
+        observations = self.observations[player]
+        (latest, slot) = self.latestObservations[player]
+        if latest >= self._lastChange(player):
+            return observations[slot]
+        if self.toPlayers is not None and self.toPlayers[player].outstanding() >= len(observations):
+            # The next buffer round is the oldest the player hasn't finished with: add a new one in front of it.
+            observations.insert(slot + 1, numpy.zeros((8, 4, 13), dtype=int))
+            self.observationVersions[player].insert(slot + 1, -1)
+        slot = (slot + 1) % len(observations)
+        observation = observations[slot]
+        written = self.observationVersions[player][slot]
+
+        observation.flags.writeable = True
+        observable = [player, self.trumps, self.openAttacks, self.closedAttacks, self.defences, self.burned]
+        rows = [row for row, zone in enumerate(observable) if self.zoneVersions[zone] > written]
+        if rows:
+            self.engine.observeInto([observable[row] for row in rows], rows, observation)
+        if self.rolesVersion > written:
+            observation[6] = (self.attacker - player) % self.numberOfPlayers
+            observation[7] = (self.defender - player) % self.numberOfPlayers
+        observation.flags.writeable = False
+
+        self.observationVersions[player][slot] = self.version
+        self.latestObservations[player] = (self.version, slot)
+        return observation
 
     def _playerState(self, player):
         # Attacker and defender should be relative to this player.
@@ -96,24 +239,22 @@ class Game:
         defender = numpy.full((4, 13), defender, dtype=int)
 
         observable = [player, self.trumps, self.openAttacks, self.closedAttacks, self.defences, self.burned]
-        return numpy.append(self.state[observable], [attacker, defender], axis=0)
+        return numpy.append(self.engine.observe(observable), [attacker, defender], axis=0)
 
     def _pickUpCards(self):
         # Previous methods must increment attacker/defender
-        pack = numpy.array(getCards(self.state, self.pack))
-        if pack.shape[1] > 0:
-            numpy.random.shuffle(numpy.transpose(pack))
-
+        if self.dealt < 52:
             # Defender picks up first, then attacker, then others.
             player = self.defender
             for _ in range(len(self.activePlayers)):
-                playerCards = numberOfCards(self.state, player)
-                if playerCards < self.minCards:
+                playerCards = self.engine.numberOfCards(player)
+                if playerCards < self.minCards and self.dealt < 52:
                     shortage = self.minCards - playerCards
-                    newCards = tuple(pack[:, :shortage])
-                    pack = pack[:, shortage:]
-                    self.state[self.pack][newCards] = numpy.zeros(length(newCards), dtype=int)
-                    self.state[player][newCards] = numpy.ones(length(newCards), dtype=int)
+                    newCards = numpy.divmod(self.deck[self.dealt:self.dealt + shortage], 13)
+                    self.dealt += length(newCards)
+                    self.engine.moveCards(newCards, self.pack, player)
+                    if self.logging:
+                        self._record('deal', player, newCards)
                 player = self._previousPlayer(player)
 
         self._updatePlayers()
@@ -126,11 +267,10 @@ class Game:
     def _successfulDefence(self):
         # Burn closed attacks and defences, but also burn any open attacks -
         # the defender might just have used their last cards.
-        print(f'Successful defence by player {self.defender}!')
+        if self.logging:
+            self._record('burn', self.defender, self._tableCards())
         for category in [self.openAttacks, self.closedAttacks, self.defences]:
-            cards = getCards(self.state, category)
-            self.state[category][cards] = numpy.zeros(length(cards), dtype=int)
-            self.state[self.burned][cards] = numpy.ones(length(cards), dtype=int)
+            self.engine.moveAll(category, self.burned)
 
         self._updateAttackerAndDefender(self.defender)
         self.turns += 1
@@ -145,172 +285,221 @@ class Game:
     def _endGame(self):
         assert len(self.activePlayers) == 1
         loser = self.activePlayers[0]
-        print(f'Player {loser} loses after {self.turns} turns!')
+        if self.logging:
+            self._record('loss', loser)
         # Give loser all the cards so they know they've lost.
         for category in [self.openAttacks, self.closedAttacks, self.defences]:
-            cards = getCards(self.state, category)
-            self.state[category][cards] = numpy.zeros(length(cards), dtype=int)
-            self.state[loser][cards] = numpy.ones(length(cards), dtype=int)
+            self.engine.moveAll(category, loser)
 
-    # Public methods: synchronisation needs to be considered!
+    def _isStale(self, player, version, kind, description):
+        # Every update players are sent carries a version number. An action is current if nothing the player can
+        # see has changed since that version; if something has, they've been sent an update about it.
+        stale = self._lastChange(player) > version
+        if self.metrics is not None:
+            self.metrics.action(kind, player, not stale)
+        if stale and self.logging:
+            self._record('reject', player, detail=description)
+        return stale
 
-    def getState(self, player):
-        # No lock required: players should be able to call this anytime.
-        # Will block until there is an update of the game state.
-        return self.toPlayers[player].receive()
+    def _record(self, kind, player=None, cards=None, attackingCard=None, detail=None):
+        self.sink.record(Event(kind, self.turns, player, cards, attackingCard, detail))
 
-    def joinAttack(self, player, playerState, card):
-        with self.lock:
-            latestPlayerState = self._playerState(player)
-            if not numpy.array_equal(playerState, latestPlayerState):
-                print(f'Player {player} joining attack based on old information - reject this action.')
-                return
+    def _tableCards(self):
+        return maskCards(self.engine.mask(self.openAttacks) | self.engine.mask(self.closedAttacks)
+                         | self.engine.mask(self.defences))
 
-            print(f'Player {player} joins attacks: attacks with {printCard(card)}...')
+    # Rules: these assume the caller holds the lock (or that the game is unsynchronised) and the action is current.
 
-            # Check a card of this value appears on the table already somewhere.
-            openAttacks = getCards(self.state, self.openAttacks)
-            closedAttacks = getCards(self.state, self.closedAttacks)
-            defences = getCards(self.state, self.defences)
+    def _joinAttack(self, player, card):
+        if self.logging:
+            self._record('join', player, card)
 
-            assert any(numpy.any(cards[1] == card[1]) for cards in [closedAttacks, defences])
-            assert self.state[player][card] == 1
-            totalAttacks = length(openAttacks) + length(closedAttacks)
-            assert totalAttacks < self.maxAttacks
+        # Check a card of this value appears on the table already somewhere.
+        assert self.engine.valuesIn([self.closedAttacks, self.defences]) >> int(card[1]) & 1
+        assert self.engine.hasCard(player, card)
+        totalAttacks = self.engine.numberOfCards(self.openAttacks) + self.engine.numberOfCards(self.closedAttacks)
+        assert totalAttacks < self.maxAttacks
 
-            self.state[player][card] = 0
-            self.state[self.openAttacks][card] = 1
+        self.engine.moveCards(card, player, self.openAttacks)
 
-            self._updatePlayers()
+        self._updatePlayers()
 
-    def attack(self, player, playerState, cards):
-        with self.lock:
-            latestPlayerState = self._playerState(player)
-            if not numpy.array_equal(playerState, latestPlayerState):
-                print(f'Player {player} attacking based on old information - reject this action.')
-                return
+    def _attack(self, player, cards):
+        if self.logging:
+            self._record('attack', player, cards)
+        # If attacking with multiple cards, check all the values are the same
+        assert popcount(valuesMask(cardsMask(cards))) == 1
+        assert self.engine.hasCards(player, cards)
+
+        self.engine.moveCards(cards, player, self.openAttacks)
 
-            print(f'Player {player} attacks with {printCards(cards)}...')
-            # If attacking with multiple cards, check all the values are the same
-            assert numpy.unique(cards[1]).size == 1
-            assert numpy.all(self.state[player][cards] == 1)
+        self._updatePlayers()
 
-            self.state[player][cards] = numpy.zeros(length(cards), dtype=int)
-            self.state[self.openAttacks][cards] = numpy.ones(length(cards), dtype=int)
+    def _bounce(self, player, cards):
+        if self.logging:
+            self._record('bounce', player, cards)
+        # Check there are only open attacks
+        # Check all open attacks have same value
+        # Check these cards have that value too
+        assert player == self.defender
+        assert self.engine.numberOfCards(self.closedAttacks) + self.engine.numberOfCards(self.defences) == 0
+        attackValues = self.engine.valuesIn([self.openAttacks])
+        assert popcount(attackValues) == 1
+        assert valuesMask(cardsMask(cards)) == attackValues
+
+        self.engine.moveCards(cards, player, self.openAttacks)
+
+        self._updateAttackerAndDefender(player)
+        self._updatePlayers()
 
-            self._updatePlayers()
+    def _defend(self, player, defendingCard, attackingCard):
+        if self.logging:
+            self._record('defend', player, defendingCard, attackingCard)
+        (attackingCardSuit, attackingCardValue) = attackingCard
+        (defendingCardSuit, defendingCardValue) = defendingCard
 
-    def bounce(self, player, playerState, cards):
-        with self.lock:
-            latestPlayerState = self._playerState(player)
-            if not numpy.array_equal(playerState, latestPlayerState):
-                print(f'Player {player} bouncing based on old information - reject this action.')
-                return
-
-            print(f'Player {player} bounces with {printCards(cards)}...')
-            # Check there are only open attacks
-            # Check all open attacks have same value
-            # Check these cards have that value too
-            assert player == self.defender
-            assert numberOfCards(self.state, self.closedAttacks) + numberOfCards(self.state, self.defences) == 0
-            attackValues = numpy.unique(getCards(self.state, self.openAttacks)[1])
-            assert attackValues.size == 1
-            assert numpy.all(cards[1] == attackValues[0])
-
-            self.state[self.openAttacks][cards] = numpy.ones(length(cards), dtype=int)
-            self.state[player][cards] = numpy.zeros(length(cards), dtype=int)
-
-            self._updateAttackerAndDefender(player)
+        assert self.engine.hasCard(self.openAttacks, attackingCard)
+        assert self.engine.hasCard(player, defendingCard)
+        assert (defendingCardValue > attackingCardValue and defendingCardSuit == attackingCardSuit) \
+            or self.engine.hasCard(self.trumps, (defendingCardSuit, 0)) and defendingCardSuit != attackingCardSuit
+
+        self.engine.moveCards(attackingCard, self.openAttacks, self.closedAttacks)
+        self.engine.moveCards(defendingCard, player, self.defences)
+
+        self.declinedToAttack[player] = False
+
+        if self.engine.numberOfCards(self.defences) == self.maxAttacks or self.engine.numberOfCards(player) == 0:
+            self._successfulDefence()
+        else:
             self._updatePlayers()
 
-    def defend(self, player, playerState, defendingCard, attackingCard):
-        with self.lock:
-            latestPlayerState = self._playerState(player)
-            if not numpy.array_equal(playerState, latestPlayerState):
-                print(f'Player {player} defending based on old information - reject this action.')
-                return
+    def _concede(self, player, attacksToConcede):
+        if self.logging:
+            self._record('concede', player, attacksToConcede)
+        numberOfOpenAttacks = self.engine.numberOfCards(self.openAttacks)
+        surplus = numberOfOpenAttacks - self.engine.numberOfCards(player)
+        assert surplus <= 0 and length(attacksToConcede) == numberOfOpenAttacks \
+            or 0 < surplus == length(attacksToConcede)
+        assert self.engine.hasCards(self.openAttacks, attacksToConcede)
 
-            print(f'Player {player} defends {printCard(attackingCard)} with {printCard(defendingCard)}...')
-            (attackingCardSuit, attackingCardValue) = attackingCard
-            (defendingCardSuit, defendingCardValue) = defendingCard
+        self.pickedUp[player] += self.engine.numberOfCards(self.closedAttacks) \
+            + self.engine.numberOfCards(self.defences) + length(attacksToConcede)
 
-            assert self.state[self.openAttacks][attackingCard] == 1
-            assert self.state[player][defendingCard] == 1
-            assert (defendingCardValue > attackingCardValue and defendingCardSuit == attackingCardSuit) \
-                or self.state[self.trumps][defendingCardSuit][0] == 1 and defendingCardSuit != attackingCardSuit
+        # Concede all the defences and closed attacks
+        for category in [self.closedAttacks, self.defences]:
+            self.engine.moveAll(category, player)
 
-            self.state[self.openAttacks][attackingCard] = 0
-            self.state[self.closedAttacks][attackingCard] = 1
-            self.state[player][defendingCard] = 0
-            self.state[self.defences][defendingCard] = 1
+        # Concede the selected open attacks cards
+        self.engine.moveCards(attacksToConcede, self.openAttacks, player)
 
-            self.declinedToAttack[player] = False
+        # Burn any leftover open attacks
+        if self.logging and self.engine.numberOfCards(self.openAttacks) > 0:
+            self._record('burn', cards=self.engine.getCards(self.openAttacks))
+        self.engine.moveAll(self.openAttacks, self.burned)
 
-            if numberOfCards(self.state, self.defences) == self.maxAttacks or numberOfCards(self.state, player) == 0:
-                self._successfulDefence()
-            else:
-                self._updatePlayers()
+        self._updateAttackerAndDefender(self._nextPlayer(player))
+        self.turns += 1
+        self._pickUpCards()
+
+    def _declineToAttack(self, player):
+        if self.logging:
+            self._record('decline', player)
+        self.declinedToAttack[player] = True
+
+        decliners = [self.declinedToAttack[player] for player in self.activePlayers]
+        everyoneDeclined = len([() for declined in decliners if declined]) == len(self.activePlayers) - 1
+        if self.engine.numberOfCards(self.openAttacks) == 0 and everyoneDeclined:
+            # If this call has ended the round then we must have a successful defence.
+            self._successfulDefence()
+
+    def _done(self, player):
+        if self.logging:
+            self._record('out', player)
+        if player == self.attacker:
+            self._updateAttackerAndDefender(self._nextPlayer(player))
+        elif player == self.defender:
+            # A player can be made defender and only then declare themselves out: the next player defends instead.
+            self.defender = self._nextPlayer(player)
+        self.activePlayers.remove(player)
+        if len(self.activePlayers) == 1:
+            self._endGame()
+        self._updatePlayers()
+
+    # Public methods: synchronisation needs to be considered!
 
-    def concede(self, player, playerState, attacksToConcede):
+    def getState(self, player):
+        return self.getVersionedState(player)[1]
+
+    def getVersionedState(self, player):
+        return self.getVersionedStates(player)[-1]
+
+    def getVersionedStates(self, player):
+        # Every (version, state) update the player has been sent since they last asked, oldest first.
+        if self.toPlayers is None:
+            return [(self.version, self._observe(player))]
+        # No lock required: players should be able to call this anytime.
+        # Will block until there is an update of the game state.
+        if self.metrics is None:
+            return self.toPlayers[player].receiveAll()
+        started = time.perf_counter_ns()
+        updates = self.toPlayers[player].receiveAll()
+        self.metrics.receive(player, updates, started)
+        return updates
+
+    async def getVersionedStatesAsync(self, player):
+        # As getVersionedStates, for games in an event loop.
+        if self.metrics is None:
+            return await self.toPlayers[player].receiveAll()
+        started = time.perf_counter_ns()
+        updates = await self.toPlayers[player].receiveAll()
+        self.metrics.receive(player, updates, started)
+        return updates
+
+    def addObserver(self, channel):
+        # Observers are sent (version, full state) after every update. An UpdateQueue(maxsize=1, dropToLatest=True)
+        # only ever holds the newest state; a bounded queue without dropToLatest holds the game up until the
+        # observer catches up. A game in an event loop can't be held up: a bounded AsyncUpdateQueue would fail
+        # halfway through updating everyone, so it must drop instead.
+        if isinstance(channel, AsyncUpdateQueue) and channel.maxsize is not None and not channel.dropToLatest:
+            raise ValueError('A bounded AsyncUpdateQueue observer must have dropToLatest=True')
         with self.lock:
-            latestPlayerState = self._playerState(player)
-            if not numpy.array_equal(playerState, latestPlayerState):
-                print(f'Player {player} conceding based on old information - reject this action.')
-                return
-
-            print(f'Player {player} concedes...')
-            numberOfOpenAttacks = numberOfCards(self.state, self.openAttacks)
-            surplus = numberOfOpenAttacks - numberOfCards(self.state, player)
-            assert surplus <= 0 and length(attacksToConcede) == numberOfOpenAttacks \
-                or 0 < surplus == length(attacksToConcede)
-            assert numpy.all(self.state[self.openAttacks][attacksToConcede] == 1)
-
-            # Concede all the defences and closed attacks
-            for category in [self.closedAttacks, self.defences]:
-                cards = getCards(self.state, category)
-                self.state[category][cards] = numpy.zeros(length(cards), dtype=int)
-                self.state[player][cards] = numpy.ones(length(cards), dtype=int)
-
-            # Concede the selected open attacks cards
-            self.state[self.openAttacks][attacksToConcede] = numpy.zeros(length(attacksToConcede), dtype=int)
-            self.state[player][attacksToConcede] = numpy.ones(length(attacksToConcede), dtype=int)
-
-            # Burn any leftover open attacks
-            leftovers = getCards(self.state, self.openAttacks)
-            self.state[self.openAttacks][leftovers] = numpy.zeros(length(leftovers), dtype=int)
-            self.state[self.burned][leftovers] = numpy.ones(length(leftovers), dtype=int)
+            self.observers.append(channel)
 
-            self._updateAttackerAndDefender(self._nextPlayer(player))
-            self.turns += 1
-            self._pickUpCards()
+    def step(self, player, action):
+        # Strict turn-taking: the caller decides whose turn it is, so there is nothing to synchronise or reject.
+        (kind, *args) = action
+        getattr(self, '_' + kind)(player, *args)
+
+    def joinAttack(self, player, version, card):
+        with self.lock:
+            if not self._isStale(player, version, 'joinAttack', 'joining attack'):
+                self._joinAttack(player, card)
 
-    def declineToAttack(self, player, playerState):
+    def attack(self, player, version, cards):
         with self.lock:
-            latestPlayerState = self._playerState(player)
-            if not numpy.array_equal(playerState, latestPlayerState):
-                print(f'Player {player} declining based on old information - reject this action.')
-                return
-
-            print(f'Player {player} declines to attack...')
-            self.declinedToAttack[player] = True
-
-            decliners = [self.declinedToAttack[player] for player in self.activePlayers]
-            everyoneDeclined = len([() for declined in decliners if declined]) == len(self.activePlayers) - 1
-            if length(getCards(self.state, self.openAttacks)) == 0 and everyoneDeclined:
-                print(f'Everyone declines to attack...')
-                # If this call has ended the round then we must have a successful defence.
-                self._successfulDefence()
-
-    def waitForUpdates(self, player, _):
+            if not self._isStale(player, version, 'attack', 'attacking'):
+                self._attack(player, cards)
+
+    def bounce(self, player, version, cards):
         with self.lock:
-            print(f'Player {player} waits for updates...')
+            if not self._isStale(player, version, 'bounce', 'bouncing'):
+                self._bounce(player, cards)
+
+    def defend(self, player, version, defendingCard, attackingCard):
+        with self.lock:
+            if not self._isStale(player, version, 'defend', 'defending'):
+                self._defend(player, defendingCard, attackingCard)
+
+    def concede(self, player, version, attacksToConcede):
+        with self.lock:
+            if not self._isStale(player, version, 'concede', 'conceding'):
+                self._concede(player, attacksToConcede)
+
+    def declineToAttack(self, player, version):
+        with self.lock:
+            if not self._isStale(player, version, 'declineToAttack', 'declining'):
+                self._declineToAttack(player)
 
     def done(self, player, _):
         with self.lock:
-            print(f'Player {player} is out!')
-            if player == self.attacker:
-                self._updateAttackerAndDefender(self._nextPlayer(player))
-            self.activePlayers.remove(player)
-            if len(self.activePlayers) == 1:
-                self._endGame()
-            self._updatePlayers()
+            self._done(player)
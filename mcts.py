@@ -0,0 +1,145 @@
+import math
+import random
+from collections import Counter, namedtuple
+
+import numpy
+
+from engines import FULL, cardsMask, maskIndices, popcount
+from player import Player
+from simulator import Simulator, actionToMove
+
+# Everything a search needs from one player's point of view, with absolute player numbers and cards as masks,
+# so it can be sent to a worker process. 'known' and 'handSizes' are the player's beliefs about each opponent,
+# starting from the next player round.
+InformationSet = namedtuple('InformationSet', [
+    'player', 'numberOfPlayers', 'minCards', 'maxAttacks', 'trumpSuit', 'hand', 'openAttacks', 'closedAttacks',
+    'defences', 'burned', 'attacker', 'defender', 'known', 'handSizes'])
+
+
+def informationSet(player, state, beliefs, numberOfPlayers, minCards, maxAttacks):
+    # From an observation, in the layout of Game._playerState, and the Beliefs built up from the ones before it.
+    (hand, openAttacks, closedAttacks, defences, burned) = [cardsMask(numpy.flatnonzero(state[row])) for row in
+                                                             [0, 2, 3, 4, 5]]
+    known = [cardsMask(numpy.flatnonzero(cards)) for cards in beliefs.known[0]]
+    return InformationSet(
+        player, numberOfPlayers, minCards, maxAttacks, int(numpy.argmax(state[1][:, 0])),
+        hand, openAttacks, closedAttacks, defences, burned,
+        (player + int(state[6][0][0])) % numberOfPlayers, (player + int(state[7][0][0])) % numberOfPlayers,
+        known, [float(size) for size in beliefs.expectedHandSizes()])
+
+
+def determinise(informationSet, random):
+    # One way the unseen cards could lie: each opponent holds the cards they're known to hold, topped up to their
+    # expected hand size from the rest, which are shuffled, and whatever's left over is the pack.
+    i = informationSet
+    unseen = FULL & ~(i.hand | i.openAttacks | i.closedAttacks | i.defences | i.burned)
+    allKnown = 0
+    for cards in i.known:
+        allKnown |= cards
+    pool = maskIndices(unseen & ~allKnown)
+    random.shuffle(pool)
+
+    hands = [0] * i.numberOfPlayers
+    hands[i.player] = i.hand
+    for opponent, (known, size) in enumerate(zip(i.known, i.handSizes), 1):
+        known &= unseen
+        extra = max(round(size) - popcount(known), 0)
+        for card in pool[:extra]:
+            known |= 1 << card
+        del pool[:extra]
+        hands[(i.player + opponent) % i.numberOfPlayers] = known
+
+    activePlayers = [player for player in range(i.numberOfPlayers)
+                     if hands[player] or player in (i.attacker, i.defender)]
+    return Simulator(i.numberOfPlayers, i.minCards, i.maxAttacks, i.trumpSuit, hands, pool, i.attacker, i.defender,
+                     activePlayers, i.player, i.openAttacks, i.closedAttacks, i.defences, i.burned)
+
+
+class Node:
+    # Statistics for a move, made by 'player', from the information set its parent stands for. 'availability'
+    # counts the iterations in which the move was legal, since in other determinisations it might not be.
+    __slots__ = ['player', 'move', 'parent', 'children', 'visits', 'availability', 'wins']
+
+    def __init__(self, player, move, parent):
+        self.player = player
+        self.move = move
+        self.parent = parent
+        self.children = {}
+        self.visits = 0
+        self.availability = 1
+        self.wins = 0
+
+
+def search(informationSet, iterations, seed=None, exploration=0.7, maxMoves=1000):
+    # Single-observer information set MCTS. Returns how often each of the player's own moves was visited.
+    rng = random.Random(seed)
+    root = Node(None, None, None)
+    for _ in range(iterations):
+        simulator = determinise(informationSet, rng)
+        node = root
+
+        # Descend through moves that are legal in this determinisation, stopping to add the first untried one.
+        while True:
+            turn = simulator.nextMover()
+            if turn is None:
+                break
+            (player, moves) = turn
+            children = [node.children.get((player, move)) for move in moves]
+            untried = [move for move, child in zip(moves, children) if child is None]
+            if untried:
+                move = untried[rng.randrange(len(untried))]
+                node.children[(player, move)] = node = Node(player, move, node)
+                simulator.apply(player, move)
+                break
+            for child in children:
+                child.availability += 1
+            node = max(children, key=lambda child: child.wins / child.visits
+                       + exploration * math.sqrt(math.log(child.availability) / child.visits))
+            simulator.apply(player, node.move)
+
+        # Every move is scored for whoever made it: a win is not being the one left holding cards.
+        loser = simulator.rollout(rng, maxMoves)
+        while node is not root:
+            node.visits += 1
+            node.wins += node.player != loser
+            node = node.parent
+
+    return {move: child.visits for (player, move), child in root.children.items()
+            if player == informationSet.player}
+
+
+class MCTSPlayer(Player):
+    # Chooses moves by searching, splitting its iterations between 'workers' independent searches whose visit
+    # counts are added together. Given a concurrent.futures executor, thread or process pool, the searches run
+    # on it; otherwise one after another.
+    def __init__(self, name, game, iterations=1000, workers=1, executor=None, exploration=0.7, seed=None):
+        super().__init__(name, game, trackBeliefs=True, seed=seed)
+        self.iterations = iterations
+        self.workers = workers
+        self.executor = executor
+        self.exploration = exploration
+
+    def chooseAction(self, state):
+        actions = self.getPossibleActions(state)
+        if len(actions) == 1:
+            return actions[0]
+
+        game = self.game
+        view = informationSet(self.name, state, self.beliefs, game.numberOfPlayers, game.minCards, game.maxAttacks)
+        share = max(self.iterations // self.workers, 1)
+        seeds = [self.random.getrandbits(64) for _ in range(self.workers)]
+        if self.executor is None:
+            results = [search(view, share, seed, self.exploration) for seed in seeds]
+        else:
+            results = self.executor.map(search, [view] * self.workers, [share] * self.workers, seeds,
+                                        [self.exploration] * self.workers)
+        visits = Counter()
+        for result in results:
+            visits.update(result)
+
+        # Beliefs can be wrong, so only consider moves that really are legal.
+        legal = {actionToMove(action): action for action in actions}
+        searched = [move for move in visits if move in legal]
+        if not searched:
+            return self.sampleAction(state)
+        return legal[max(searched, key=visits.get)]
@@ -0,0 +1,137 @@
+import time
+from collections import Counter, deque
+
+# Instrumentation for a synchronised game, passed in as Game(metrics=GameMetrics(numberOfPlayers)). Games without
+# it skip all of this. Everything is recorded either under the game's lock or by the one thread that owns it
+# (each player's thread has its own counters), so recording needs no locking of its own.
+
+BUCKETS = 48
+
+
+class Histogram:
+    # Durations in nanoseconds, counted in power-of-two buckets: bucket i holds durations below 2^i ns.
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, nanoseconds):
+        self.counts[min(nanoseconds.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        # The upper bound of the bucket the percentile falls in.
+        target = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(2 ** i, self.max)
+        return 0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'meanMicroseconds': self.total / self.count / 1000 if self.count else 0,
+            'p50Microseconds': self.percentile(0.5) / 1000,
+            'p90Microseconds': self.percentile(0.9) / 1000,
+            'p99Microseconds': self.percentile(0.99) / 1000,
+            'maxMicroseconds': self.max / 1000,
+            'buckets': {f'<{2 ** i / 1000:g}us': count for i, count in enumerate(self.counts) if count},
+        }
+
+
+class TimedLock:
+    # Wraps a lock to time how long threads wait for it and then hold it.
+    def __init__(self, lock, metrics):
+        self.lock = lock
+        self.metrics = metrics
+        self.acquired = 0
+
+    def __enter__(self):
+        start = time.perf_counter_ns()
+        self.lock.acquire()
+        self.acquired = time.perf_counter_ns()
+        self.metrics.lockWait.add(self.acquired - start)
+        return self
+
+    def __exit__(self, *_):
+        self.metrics.lockHold.add(time.perf_counter_ns() - self.acquired)
+        self.lock.release()
+
+
+class GameMetrics:
+    def __init__(self, numberOfPlayers):
+        self.lockWait = Histogram()
+        self.lockHold = Histogram()
+        # (kind, player) -> count, for actions that were current and actions rejected as stale.
+        self.accepted = Counter()
+        self.rejected = Counter()
+
+        # Per player: how often they had nothing to do and waited, how long each wait for an update took, and
+        # how long updates took to reach them from being sent.
+        self.waits = [0] * numberOfPlayers
+        self.blocked = [Histogram() for _ in range(numberOfPlayers)]
+        self.fanOut = [Histogram() for _ in range(numberOfPlayers)]
+        self.sent = [deque() for _ in range(numberOfPlayers)]
+
+    def action(self, kind, player, accepted):
+        (self.accepted if accepted else self.rejected)[(kind, player)] += 1
+
+    def wait(self, player):
+        self.waits[player] += 1
+
+    def send(self, player, version):
+        self.sent[player].append((version, time.perf_counter_ns()))
+
+    def receive(self, player, updates, started):
+        # Updates arrive in the order they were sent, but some may have been dropped on the way.
+        now = time.perf_counter_ns()
+        self.blocked[player].add(now - started)
+        sent = self.sent[player]
+        latest = updates[-1][0]
+        received = {version for (version, _) in updates}
+        while sent and sent[0][0] <= latest:
+            (version, at) = sent.popleft()
+            if version in received:
+                self.fanOut[player].add(now - at)
+
+    def snapshot(self):
+        # A plain, JSON-ready summary of everything so far.
+        actions = {}
+        for counter, outcome in [(self.accepted, 'accepted'), (self.rejected, 'rejected')]:
+            for (kind, player), count in counter.items():
+                entry = actions.setdefault(kind, {'accepted': 0, 'rejected': 0, 'byPlayer': {}})
+                entry[outcome] += count
+                entry['byPlayer'].setdefault(str(player), {'accepted': 0, 'rejected': 0})[outcome] += count
+        accepted = sum(self.accepted.values())
+        rejected = sum(self.rejected.values())
+
+        blocked = Histogram()
+        fanOut = Histogram()
+        for player in range(len(self.waits)):
+            blocked.merge(self.blocked[player])
+            fanOut.merge(self.fanOut[player])
+
+        return {
+            'lockWait': self.lockWait.summary(),
+            'lockHold': self.lockHold.summary(),
+            'actions': actions,
+            'accepted': accepted,
+            'rejected': rejected,
+            'rejectionRate': rejected / (accepted + rejected) if accepted + rejected else 0,
+            'waits': {str(player): count for player, count in enumerate(self.waits)},
+            'blocked': blocked.summary(),
+            'fanOut': fanOut.summary(),
+        }
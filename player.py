@@ -1,27 +1,81 @@
-import random
 import time
-from functools import partial
-from itertools import combinations
+from bisect import bisect_right, insort
+from collections import namedtuple
+from math import comb
 
 import numpy
 
-from game import getCards, numberOfCards, length
+from beliefs import Beliefs
+from game import getCards, numberOfCards, length, pythonRandom
 
 
-def allSublists(xs, maxSize=None):
-    if maxSize is None:
-        maxSize = len(xs)
-    return [numpy.array(ys) for i in range(1, maxSize + 1) for ys in combinations(xs, i)]
+def nthSubset(xs, n):
+    # The non-empty subsets of xs, numbered 0 to 2^len(xs) - 2 by their bitmask minus one.
+    return tuple(x for i, x in enumerate(xs) if (n + 1) >> i & 1)
+
+
+def nthCombination(xs, size, n):
+    # The n-th combination of 'size' elements of xs, in the order itertools.combinations would produce them.
+    combination = []
+    start = 0
+    for remaining in range(size, 0, -1):
+        for i in range(start, len(xs)):
+            following = comb(len(xs) - i - 1, remaining - 1)
+            if n < following:
+                combination.append(xs[i])
+                start = i + 1
+                break
+            n -= following
+    return tuple(combination)
+
+
+# Actions are tuples naming the Game method to call, followed by its arguments.
+# WAIT is the exception: it means there's nothing to do until the state changes, so it's never sent to the game.
+WAIT = ('waitForUpdates',)
+
+# A family of actions that can be counted, and indexed into, without building every action in it.
+ActionGroup = namedtuple('ActionGroup', ['count', 'action'])
+
+
+def single(action):
+    return ActionGroup(1, lambda _: action)
+
+
+class Hand:
+    # Indexes of the cards in a hand by value and by suit, updated only for the cards that change.
+    def __init__(self):
+        self.cards = numpy.zeros((4, 13), dtype=int)
+        self.byValue = [[] for _ in range(13)]
+        self.bySuit = [[] for _ in range(4)]
+        self.size = 0
+
+    def update(self, cards):
+        for suit, value in zip(*numpy.nonzero(cards != self.cards)):
+            (suit, value) = (int(suit), int(value))
+            if cards[suit][value] == 1:
+                insort(self.byValue[value], suit)
+                insort(self.bySuit[suit], value)
+                self.size += 1
+            else:
+                self.byValue[value].remove(suit)
+                self.bySuit[suit].remove(value)
+                self.size -= 1
+        numpy.copyto(self.cards, cards)
 
 
 class Player:
-    def __init__(self, name, game):
+    def __init__(self, name, game, trackBeliefs=False, seed=None):
         # Players should all believe that they are player 0, although they will have a 'true' name too.
         # The indices of the attacker and defender will then be relative to this player.
         self.name = name
         self.game = game
+        # Every random choice comes from the player's own generator: the game's stream for their seat, unless
+        # they're given a seed.
+        self.random = pythonRandom(game.playerSeeds[name] if seed is None else seed)
+        self.hand = Hand()
+        # Beliefs about other players' cards, updated from every observation the player is given.
+        self.beliefs = Beliefs(game.numberOfPlayers, game.minCards) if trackBeliefs else None
 
-        # ToDo: player should hold and update beliefs about other players' cards.
         self.cards = 0
         self.trumps = 1
         self.openAttacks = 2
@@ -33,16 +87,50 @@ class Player:
         self.defender = 7
 
     def play(self):
-        state = self.game.getState(self.name)
+        # Blocks between updates: after acting, or when there's nothing to do, the next update is what we need.
+        (version, state) = self.receive(self.game.getVersionedStates(self.name))
         while self.hasCards(state) and not self.hasLost(state):
-            actions = self.getPossibleActions(state)
-            action = random.choice(actions)
-            action()
+            action = self.chooseAction(state)
+            if action != WAIT:
+                self.perform(version, action)
+            elif self.game.metrics is not None:
+                self.game.metrics.wait(self.name)
             # time.sleep(random.uniform(3, 5))
-            state = self.game.getState(self.name)
+            (version, state) = self.receive(self.game.getVersionedStates(self.name))
+        if not self.hasLost(state):
+            self.game.done(self.name, None)
+
+    async def playAsync(self):
+        # As play, for a game hosted in an asyncio event loop.
+        (version, state) = self.receive(await self.game.getVersionedStatesAsync(self.name))
+        while self.hasCards(state) and not self.hasLost(state):
+            action = self.chooseAction(state)
+            if action != WAIT:
+                self.perform(version, action)
+            elif self.game.metrics is not None:
+                self.game.metrics.wait(self.name)
+            (version, state) = self.receive(await self.game.getVersionedStatesAsync(self.name))
         if not self.hasLost(state):
             self.game.done(self.name, None)
 
+    def receive(self, updates):
+        # Every update is observed, in order, but only the latest is acted on.
+        for (_, state) in updates:
+            self.observe(state)
+        return updates[-1]
+
+    def observe(self, state):
+        if self.beliefs is not None:
+            self.beliefs.update(state)
+
+    def chooseAction(self, state):
+        return self.sampleAction(state)
+
+    def perform(self, version, action):
+        # The game rejects the action if it was chosen based on an out of date version of the state.
+        (kind, *args) = action
+        getattr(self.game, kind)(self.name, version, *args)
+
     def hasCards(self, state):
         return numberOfCards(state, self.cards) > 0
 
@@ -50,75 +138,106 @@ class Player:
         return numberOfCards(state, self.cards) + numberOfCards(state, self.burned) == 52
 
     def getPossibleActions(self, state):
+        return [group.action(i) for group in self.actionGroups(state) for i in range(group.count)]
+
+    def countActions(self, state):
+        return sum(group.count for group in self.actionGroups(state))
+
+    def sampleAction(self, state):
+        # Uniform over getPossibleActions, but only the chosen action is ever built.
+        groups = self.actionGroups(state)
+        n = self.random.randrange(sum(group.count for group in groups))
+        for group in groups:
+            if n < group.count:
+                return group.action(n)
+            n -= group.count
+
+    def actionGroups(self, state):
         # Must only use the state to determine actions, nothing else.
+        self.hand.update(state[self.cards])
         openAttacks = getCards(state, self.openAttacks)
         closedAttacks = getCards(state, self.closedAttacks)
         defences = getCards(state, self.defences)
-        cards = getCards(state, self.cards)
 
         if self.isDefender(state):
             if length(openAttacks) == 0:
                 # Can't defend until we've been attacked.
-                return [partial(self.game.waitForUpdates, self.name, state)]
-            actions = []
+                return [single(WAIT)]
+            groups = []
             if length(closedAttacks) + length(defences) == 0:
-                actions.extend(self.bounceActions(cards, openAttacks, state))
-            actions.extend(self.concedeActions(cards, openAttacks, state))
-            actions.extend(self.defendActions(cards, openAttacks, state))
-            return actions
+                groups.append(self.bounceActions(openAttacks))
+            groups.append(self.concedeActions(openAttacks))
+            groups.append(self.defendActions(openAttacks, state))
+            return groups
 
         elif self.isAttacker(state) and length(openAttacks) + length(closedAttacks) == 0:
-            return self.attackActions(cards, state)
+            return [self.attackActions()]
 
         # Can only attack if defender has elected to defend and there are fewer than 'maxAttacks' attacks already.
         elif length(defences) > 0 and length(openAttacks) + length(closedAttacks) < self.game.maxAttacks:
-            actions = [partial(self.game.declineToAttack, self.name, state)]
-            actions.extend(self.joinAttackActions(cards, closedAttacks, defences, state))
-            return actions
+            return [single(('declineToAttack',)), self.joinAttackActions(closedAttacks, defences)]
 
         else:
-            return [partial(self.game.waitForUpdates, self.name, state)]
+            return [single(WAIT)]
 
-    def concedeActions(self, cards, openAttacks, state):
+    def concedeActions(self, openAttacks):
         # If there are more open attacks than we have cards, then only pick up as many as we have cards.
-        actions = []
-        surplusAttacks = length(openAttacks) - length(cards)
+        attacks = [(int(suit), int(value)) for suit, value in zip(*openAttacks)]
+        surplusAttacks = len(attacks) - self.hand.size
         if surplusAttacks > 0:
-            for attacks in combinations(numpy.array(openAttacks).T, surplusAttacks):
-                actions.append(partial(self.game.concede, self.name, state, tuple(numpy.array(attacks).T)))
-        else:
-            actions.append(partial(self.game.concede, self.name, state, openAttacks))
-        return actions
+            return ActionGroup(
+                comb(len(attacks), surplusAttacks),
+                lambda n: ('concede', tuple(zip(*nthCombination(attacks, surplusAttacks, n)))))
+        return single(('concede', tuple(zip(*attacks))))
 
-    def joinAttackActions(self, cards, closedAttacks, defences, state):
+    def joinAttackActions(self, closedAttacks, defences):
         # Can only attack with cards whose values are already on the table.
-        valuesAllowed = numpy.concatenate((closedAttacks[1], defences[1]), axis=None)
-        indices = numpy.where(numpy.isin(cards[1], valuesAllowed))[0]
-        for i in indices:
-            card = (cards[0][i], cards[1][i])
-            yield partial(self.game.joinAttack, self.name, state, card)
+        valuesAllowed = set(closedAttacks[1].tolist()) | set(defences[1].tolist())
+        cards = [(suit, value) for value in sorted(valuesAllowed) for suit in self.hand.byValue[value]]
+        return ActionGroup(len(cards), lambda n: ('joinAttack', cards[n]))
 
-    def attackActions(self, cards, state):
+    def attackActions(self):
         # Can attack with multiple cards of the same value
-        for value in range(13):
-            valueCards = numpy.array(cards).T[numpy.where(cards[1] == value)]
-            attacks = allSublists(valueCards)
-            for attack in attacks:
-                yield partial(self.game.attack, self.name, state, tuple(attack.T))
-
-    def defendActions(self, cards, openAttacks, state):
-        # ToDo: optimise all this switching between numpy arrays and tuples
-        for attack in numpy.array(openAttacks).T:
-            for card in numpy.array(cards).T:
-                if self.canDefend(attack, card, state):
-                    yield partial(self.game.defend, self.name, state, tuple(card.T), tuple(attack.T))
-
-    def bounceActions(self, cards, openAttacks, state):
-        attackValue = openAttacks[1][0]
-        bounceCards = numpy.array(cards).T[numpy.where(cards[1] == attackValue)]
-        bounces = allSublists(bounceCards)
-        for bounce in bounces:
-            yield partial(self.game.bounce, self.name, state, tuple(bounce.T))
+        values = [value for value in range(13) if self.hand.byValue[value]]
+        counts = [2 ** len(self.hand.byValue[value]) - 1 for value in values]
+
+        def action(n):
+            for value, count in zip(values, counts):
+                if n < count:
+                    return self.sameValueAction('attack', value, n)
+                n -= count
+
+        return ActionGroup(sum(counts), action)
+
+    def defendActions(self, openAttacks, state):
+        # A card beats an attack if it's a higher card of the same suit, or if it's a trump and the attack isn't.
+        trumps = self.trumpSuit(state)
+        options = []
+        for attack in zip(openAttacks[0].tolist(), openAttacks[1].tolist()):
+            (suit, value) = attack
+            higher = self.hand.bySuit[suit][bisect_right(self.hand.bySuit[suit], value):]
+            trumpValues = self.hand.bySuit[trumps] if suit != trumps else []
+            options.append((attack, higher, trumpValues))
+        counts = [len(higher) + len(trumpValues) for (_, higher, trumpValues) in options]
+
+        def action(n):
+            for (attack, higher, trumpValues), count in zip(options, counts):
+                if n < count:
+                    card = (attack[0], higher[n]) if n < len(higher) else (trumps, trumpValues[n - len(higher)])
+                    return ('defend', card, attack)
+                n -= count
+
+        return ActionGroup(sum(counts), action)
+
+    def bounceActions(self, openAttacks):
+        attackValue = int(openAttacks[1][0])
+        return ActionGroup(
+            2 ** len(self.hand.byValue[attackValue]) - 1,
+            lambda n: self.sameValueAction('bounce', attackValue, n))
+
+    def sameValueAction(self, kind, value, n):
+        suits = nthSubset(self.hand.byValue[value], n)
+        return (kind, (suits, (value,) * len(suits)))
 
     def isDefender(self, state):
         return state[self.defender][0][0] == 0
@@ -126,10 +245,30 @@ class Player:
     def isAttacker(self, state):
         return state[self.attacker][0][0] == 0
 
-    def canDefend(self, attack, card, state):
-        (attackSuit, attackValue) = tuple(attack)
-        (suit, value) = tuple(card)
-        if suit == attackSuit:
-            return value > attackValue
-        else:
-            return state[self.trumps][suit][0] == 1
+    def trumpSuit(self, state):
+        return int(numpy.argmax(state[self.trumps][:, 0]))
+
+
+class GreedyPlayer(Player):
+    # A simple baseline strategy: gets rid of its cheapest cards first, keeping high cards and trumps for later;
+    # joins attacks only with low cards, and only concedes when it can't do anything else.
+    def chooseAction(self, state):
+        trumps = self.trumpSuit(state)
+        return min(self.getPossibleActions(state), key=lambda action: self.cost(action, trumps))
+
+    def cost(self, action, trumps):
+        # Lower is better: (how much it's to be avoided, what the cards played are worth, fewer cards played).
+        (kind, *args) = action
+        if kind in ('attack', 'bounce'):
+            (suits, values) = args[0]
+            return (0, values[0] + 13 * (trumps in suits), -len(suits))
+        elif kind == 'defend':
+            (suit, value) = args[0]
+            return (0, value + 13 * (suit == trumps), 0)
+        elif kind == 'joinAttack':
+            (suit, value) = args[0]
+            worth = value + 13 * (suit == trumps)
+            return (0 if worth < 9 else 2, worth, 0)
+        elif kind == 'declineToAttack':
+            return (1, 0, 0)
+        return (3, 0, 0)
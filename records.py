@@ -0,0 +1,149 @@
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+import numpy
+
+from actions import ActionSpace
+from engines import BitboardEngine
+from game import Game
+from player import Player
+from simulation import Scheduler
+
+# A game is fully determined by its settings, trump suit, first attacker and deck order, plus every move made:
+# which player moved and the ActionSpace index of their action (or DONE when they went out).
+GameRecord = namedtuple('GameRecord', ['numberOfPlayers', 'minCards', 'maxAttacks', 'trumps', 'attacker', 'deck',
+                                       'moves'])
+
+DONE = 0xFFFF
+MOVE = numpy.dtype([('player', 'u1'), ('action', '<u2')])
+
+# File layout: MAGIC, then for each game a fixed-size HEADER followed by its moves, three bytes each.
+MAGIC = b'DRK1'
+HEADER = struct.Struct('<BBBBB52sI')
+
+
+class Recorder:
+    # Stands in for Game.step (e.g. passed to a Scheduler) and writes down every move before making it.
+    def __init__(self, game):
+        self.game = game
+        self.space = ActionSpace(game.maxAttacks)
+        self.moves = []
+
+    def step(self, player, action):
+        if action[0] == 'done':
+            index = DONE
+        else:
+            index = self.space.encode(action, self.game.getState(player))
+        self.moves.append((player, index))
+        self.game.step(player, action)
+
+    def record(self):
+        game = self.game
+        return GameRecord(game.numberOfPlayers, game.minCards, game.maxAttacks, game.trumpSuit, game.firstAttacker,
+                          game.deck.copy(), numpy.array(self.moves, dtype=MOVE))
+
+
+def playRecordedGame(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, seed=None):
+    game = Game(numberOfPlayers, minCards, maxAttacks, engine=engine, synchronised=False, seed=seed)
+    recorder = Recorder(game)
+    Scheduler(game, [Player(i, game) for i in range(numberOfPlayers)], recorder).run()
+    return recorder.record()
+
+
+def replay(record, steps=None, engine=BitboardEngine, sink=None):
+    # The game as it was after its first 'steps' moves (or all of them).
+    game = Game(record.numberOfPlayers, record.minCards, record.maxAttacks, engine=engine, synchronised=False,
+                sink=sink, trumps=int(record.trumps), attacker=int(record.attacker), deck=record.deck)
+    space = ActionSpace(record.maxAttacks)
+    for (player, index) in record.moves[:steps].tolist():
+        if index == DONE:
+            game.step(player, ('done',))
+        else:
+            game.step(player, space.decode(index, game.getState(player)))
+    return game
+
+
+class RecordWriter:
+    # Appends games to a record file, creating it if need be.
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(MAGIC)
+
+    def write(self, record):
+        moves = numpy.asarray(record.moves, dtype=MOVE)
+        deck = numpy.asarray(record.deck, dtype=numpy.uint8).tobytes()
+        self.file.write(HEADER.pack(record.numberOfPlayers, record.minCards, record.maxAttacks, record.trumps,
+                                    record.attacker, deck, len(moves)))
+        self.file.write(moves.tobytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class RecordReader:
+    # Memory-maps a record file and indexes where each game starts, so any game, or any step of any game,
+    # can be reached without reading the games before it.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+            if self.data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{path} is not a game record file')
+            self.offsets = self._index(path)
+        except Exception:
+            self.close()
+            raise
+
+    # Where each game starts, checking that every game's header and moves lie within the file.
+    def _index(self, path):
+        offsets = []
+        offset = len(MAGIC)
+        while offset < len(self.data):
+            if offset + HEADER.size > len(self.data):
+                raise ValueError(f'{path} is truncated in the header of game {len(offsets)}')
+            numberOfMoves = HEADER.unpack_from(self.data, offset)[-1]
+            end = offset + HEADER.size + numberOfMoves * MOVE.itemsize
+            if end > len(self.data):
+                raise ValueError(f'{path} is truncated in the moves of game {len(offsets)}')
+            offsets.append(offset)
+            offset = end
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, n):
+        offset = self.offsets[n]
+        (numberOfPlayers, minCards, maxAttacks, trumps, attacker, deck, numberOfMoves) = \
+            HEADER.unpack_from(self.data, offset)
+        moves = numpy.frombuffer(self.data, dtype=MOVE, count=numberOfMoves, offset=offset + HEADER.size).copy()
+        deck = numpy.frombuffer(deck, dtype=numpy.uint8).astype(int)
+        return GameRecord(numberOfPlayers, minCards, maxAttacks, trumps, attacker, deck, moves)
+
+    def __iter__(self):
+        return (self[n] for n in range(len(self)))
+
+    def state(self, n, step, engine=BitboardEngine):
+        # Game n after its first 'step' moves.
+        return replay(self[n], step, engine=engine)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
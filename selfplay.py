@@ -0,0 +1,82 @@
+import asyncio
+from collections import Counter, namedtuple
+from multiprocessing import Pool
+
+import numpy
+
+from communication import AsyncUpdateQueue
+from engines import BitboardEngine
+from game import Game, seedStreams
+from player import Player
+from simulation import Scheduler
+
+GameResult = namedtuple('GameResult', ['loser', 'turns', 'pickedUp', 'actions'])
+
+
+def playGame(numberOfPlayers, minCards, maxAttacks, seed=None):
+    game = Game(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, synchronised=False, seed=seed)
+    players = [Player(i, game) for i in range(numberOfPlayers)]
+    scheduler = Scheduler(game, players)
+    loser = scheduler.run()
+    return GameResult(loser, game.turns, tuple(int(cards) for cards in game.pickedUp), dict(scheduler.actions))
+
+
+async def playGameAsync(numberOfPlayers, minCards, maxAttacks, seed=None):
+    # The players take turns as coroutines rather than being scheduled, so there are no action counts.
+    game = Game(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, synchronised=False,
+                channel=AsyncUpdateQueue, seed=seed)
+    players = [Player(i, game) for i in range(numberOfPlayers)]
+    await asyncio.gather(*[player.playAsync() for player in players])
+    return GameResult(game.activePlayers[0], game.turns, tuple(int(cards) for cards in game.pickedUp), {})
+
+
+def runGamesConcurrently(numberOfPlayers, minCards, maxAttacks, numberOfGames, seed=None):
+    # Every game, and all of its players, in a single event loop. Each game has its own random streams, so
+    # interleaving them doesn't change how any of them goes.
+    async def playAll():
+        return await asyncio.gather(*[playGameAsync(numberOfPlayers, minCards, maxAttacks, gameSeed)
+                                      for gameSeed in seedStreams(seed, numberOfGames)])
+
+    return asyncio.run(playAll())
+
+
+def _playGames(task):
+    # Every game has its own seed, so results don't depend on which worker happens to play it.
+    (numberOfPlayers, minCards, maxAttacks, seeds) = task
+    return [playGame(numberOfPlayers, minCards, maxAttacks, gameSeed) for gameSeed in seeds]
+
+
+def runGames(numberOfPlayers, minCards, maxAttacks, numberOfGames, workers=None, seed=None, gamesPerTask=10):
+    # Yields results as soon as each batch of games finishes, in no particular order.
+    seeds = seedStreams(seed, numberOfGames)
+    tasks = [(numberOfPlayers, minCards, maxAttacks, seeds[start:start + gamesPerTask])
+             for start in range(0, numberOfGames, gamesPerTask)]
+
+    with Pool(workers) as pool:
+        for results in pool.imap_unordered(_playGames, tasks):
+            yield from results
+
+
+def summarise(results, numberOfPlayers):
+    games = 0
+    losses = [0] * numberOfPlayers
+    pickedUp = [0] * numberOfPlayers
+    turns = []
+    actions = Counter()
+    for result in results:
+        games += 1
+        losses[result.loser] += 1
+        for player, cards in enumerate(result.pickedUp):
+            pickedUp[player] += cards
+        turns.append(result.turns)
+        actions.update(result.actions)
+
+    return {
+        'games': games,
+        'lossRate': [loss / games for loss in losses],
+        'meanCardsPickedUp': [cards / games for cards in pickedUp],
+        'meanTurns': float(numpy.mean(turns)),
+        'minTurns': int(numpy.min(turns)),
+        'maxTurns': int(numpy.max(turns)),
+        'meanActions': {kind: count / games for kind, count in sorted(actions.items())},
+    }
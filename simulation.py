@@ -0,0 +1,79 @@
+from collections import Counter
+
+from engines import BitboardEngine
+from game import Game
+from player import Player, WAIT
+
+
+class Scheduler:
+    # Strict turn-taking for an unsynchronised game: going round the table from the last player to move,
+    # the first player with something other than waiting to do gets to act.
+    def __init__(self, game, players, recorder=None):
+        assert not game.synchronised
+        self.game = game
+        self.players = players
+        # Every move goes through the recorder, if there is one, so it can be written down.
+        self.applyAction = game.step if recorder is None else recorder.step
+        self.current = game.attacker
+        self.actions = Counter()
+        # Players keeping beliefs see the same updates they would through a synchronised game's queues: one each
+        # time something they can see changes.
+        self.observers = [player for player in range(len(players)) if players[player].beliefs is not None]
+        self.observed = [-1] * len(players)
+        self._notify()
+
+    def apply(self, player, action):
+        self.applyAction(player, action)
+        self._notify()
+
+    def _notify(self):
+        for player in self.observers:
+            if player in self.game.activePlayers and self.game.sentVersions[player] > self.observed[player]:
+                self.observed[player] = self.game.sentVersions[player]
+                self.players[player].observe(self.game.getState(player))
+
+    def finished(self):
+        return len(self.game.activePlayers) == 1
+
+    def _removeFinishedPlayers(self):
+        # As in Player.play, anyone who has run out of cards declares themselves out before anything else happens.
+        # Counting the cards in the engine saves building an observation for every player before every move.
+        for player in list(self.game.activePlayers):
+            if self.finished():
+                return
+            if self.game.engine.numberOfCards(player) == 0:
+                self.apply(player, ('done',))
+
+    def nextMove(self):
+        self._removeFinishedPlayers()
+        if self.finished():
+            return None
+        for offset in range(self.game.numberOfPlayers):
+            player = (self.current + offset) % self.game.numberOfPlayers
+            if player in self.game.activePlayers:
+                action = self.players[player].chooseAction(self.game.getState(player))
+                if action != WAIT:
+                    return player, action
+        raise RuntimeError('No player is able to move.')
+
+    def step(self):
+        move = self.nextMove()
+        if move is None:
+            return False
+        (player, action) = move
+        self.apply(player, action)
+        self.actions[action[0]] += 1
+        self.current = (player + 1) % self.game.numberOfPlayers
+        return True
+
+    def run(self):
+        while self.step():
+            pass
+        return self.game.activePlayers[0]
+
+
+def simulate(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, seed=None):
+    game = Game(numberOfPlayers, minCards, maxAttacks, engine=engine, synchronised=False, seed=seed)
+    players = [Player(i, game) for i in range(numberOfPlayers)]
+    Scheduler(game, players).run()
+    return game
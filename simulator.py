@@ -0,0 +1,282 @@
+from engines import cardsMask, maskIndices, popcount
+
+# The same rules as Game, played the way a Scheduler plays them, on bitmasks and plain lists: no numpy, locks,
+# channels or events, so a position can be copied, or a move made and taken back, in a few microseconds.
+#
+# Moves are small hashable tuples of card numbers (13 * suit + value) and card masks:
+#   ('attack', cards), ('bounce', cards), ('concede', cards), ('joinAttack', card), ('defend', card, attacked),
+#   ('declineToAttack',)
+# moveToAction and actionToMove convert between these and the actions Player sends to Game.
+
+SUITS = [((1 << 13) - 1) << (13 * suit) for suit in range(4)]
+VALUES = [sum(1 << (13 * suit + value) for suit in range(4)) for value in range(13)]
+HIGHER = [SUITS[card // 13] & ~((1 << (card + 1)) - 1) for card in range(52)]
+DECLINE = ('declineToAttack',)
+
+
+def subsets(mask):
+    # Every non-empty subset of a mask.
+    subset = mask
+    while subset:
+        yield subset
+        subset = (subset - 1) & mask
+
+
+def valuesIn(mask):
+    # A mask of every card sharing a value with a card in this one.
+    values = 0
+    for card in maskIndices(mask):
+        values |= VALUES[card % 13]
+    return values
+
+
+def moveToAction(move):
+    kind = move[0]
+    if kind in ('attack', 'bounce', 'concede'):
+        cards = maskIndices(move[1])
+        return (kind, (tuple(card // 13 for card in cards), tuple(card % 13 for card in cards)))
+    elif kind == 'joinAttack':
+        return (kind, divmod(move[1], 13))
+    elif kind == 'defend':
+        return (kind, divmod(move[1], 13), divmod(move[2], 13))
+    return move
+
+
+def actionToMove(action):
+    (kind, *args) = action
+    if kind in ('attack', 'bounce', 'concede'):
+        return (kind, cardsMask(args[0]))
+    elif kind == 'joinAttack':
+        return (kind, cardsMask(args[0]).bit_length() - 1)
+    elif kind == 'defend':
+        return (kind, cardsMask(args[0]).bit_length() - 1, cardsMask(args[1]).bit_length() - 1)
+    return tuple(action)
+
+
+def simulatorFromGame(game, current=None):
+    # A copy of an unfinished game, seeing everything, including every hand and the order of the pack.
+    zones = [game.engine.mask(zone) for zone in range(game.numberOfPlayers + 5)]
+    simulator = Simulator(game.numberOfPlayers, game.minCards, game.maxAttacks, game.trumpSuit,
+                          zones[:game.numberOfPlayers], game.deck.tolist(), game.attacker, game.defender,
+                          game.activePlayers, current, zones[game.openAttacks], zones[game.closedAttacks],
+                          zones[game.defences], zones[game.burned], game.dealt)
+    simulator.declinedToAttack = list(game.declinedToAttack)
+    return simulator
+
+
+class Simulator:
+    def __init__(self, numberOfPlayers, minCards, maxAttacks, trumpSuit, hands, deck, attacker, defender,
+                 activePlayers=None, current=None, openAttacks=0, closedAttacks=0, defences=0, burned=0, dealt=0):
+        self.numberOfPlayers = numberOfPlayers
+        self.minCards = minCards
+        self.maxAttacks = maxAttacks
+        self.trumpSuit = trumpSuit
+        self.trumps = SUITS[trumpSuit]
+
+        # Hands are masks, by absolute player. As in Game, cards are dealt from deck[dealt:], and the deck itself
+        # never changes, so copies can share it; it need only hold the cards still to be dealt.
+        self.hands = list(hands)
+        self.deck = deck
+        self.dealt = dealt
+        self.openAttacks = openAttacks
+        self.closedAttacks = closedAttacks
+        self.defences = defences
+        self.burned = burned
+
+        self.attacker = attacker
+        self.defender = defender
+        self.activePlayers = list(range(numberOfPlayers)) if activePlayers is None else list(activePlayers)
+        self.declinedToAttack = [False] * numberOfPlayers
+        # Whoever the Scheduler would ask first for a move.
+        self.current = attacker if current is None else current
+
+    def clone(self):
+        simulator = Simulator.__new__(Simulator)
+        simulator.__dict__.update(self.__dict__)
+        simulator.restore(self.snapshot())
+        return simulator
+
+    def snapshot(self):
+        return (self.hands[:], self.dealt, self.openAttacks, self.closedAttacks, self.defences, self.burned,
+                self.attacker, self.defender, self.activePlayers[:], self.declinedToAttack[:], self.current)
+
+    def restore(self, snapshot):
+        (hands, self.dealt, self.openAttacks, self.closedAttacks, self.defences, self.burned,
+         self.attacker, self.defender, activePlayers, declinedToAttack, self.current) = snapshot
+        self.hands = hands[:]
+        self.activePlayers = activePlayers[:]
+        self.declinedToAttack = declinedToAttack[:]
+
+    def make(self, player, move):
+        # Makes a move in place, returning what undo needs to take it back.
+        snapshot = self.snapshot()
+        self.apply(player, move)
+        return snapshot
+
+    def undo(self, snapshot):
+        self.restore(snapshot)
+
+    def finished(self):
+        return len(self.activePlayers) == 1
+
+    def loser(self):
+        # If a game is cut short, whoever holds the most cards is counted as losing.
+        return max(self.activePlayers, key=lambda player: popcount(self.hands[player]))
+
+    # Turn-taking, as in Scheduler.
+
+    def nextMover(self):
+        # The player to move and their moves, or None once the game is over.
+        hands = self.hands
+        if not all(hands[player] for player in self.activePlayers):
+            for player in self.activePlayers[:]:
+                if self.finished():
+                    return None
+                if not hands[player]:
+                    self._done(player)
+        if self.finished():
+            return None
+        for offset in range(self.numberOfPlayers):
+            player = (self.current + offset) % self.numberOfPlayers
+            if player in self.activePlayers:
+                moves = self.legalMoves(player)
+                if moves:
+                    return player, moves
+        return None
+
+    def apply(self, player, move):
+        getattr(self, '_' + move[0])(player, *move[1:])
+        self.current = (player + 1) % self.numberOfPlayers
+
+    def rollout(self, random, maxMoves=1000):
+        # Uniformly random moves, as Player.sampleAction would choose them, until someone loses.
+        for _ in range(maxMoves):
+            turn = self.nextMover()
+            if turn is None:
+                break
+            (player, moves) = turn
+            self.apply(player, moves[random.randrange(len(moves))])
+        return self.loser()
+
+    def legalMoves(self, player):
+        # The same moves as Player.getPossibleActions, or none if the player would wait.
+        hand = self.hands[player]
+        table = self.openAttacks | self.closedAttacks
+        if player == self.defender:
+            if not self.openAttacks:
+                return []
+            moves = []
+            if not self.closedAttacks and not self.defences:
+                value = (self.openAttacks & -self.openAttacks).bit_length() - 1
+                moves.extend(('bounce', cards) for cards in subsets(hand & VALUES[value % 13]))
+            surplus = popcount(self.openAttacks) - popcount(hand)
+            if surplus > 0:
+                moves.extend(('concede', cards) for cards in subsets(self.openAttacks) if popcount(cards) == surplus)
+            else:
+                moves.append(('concede', self.openAttacks))
+            for attacked in maskIndices(self.openAttacks):
+                beats = HIGHER[attacked] if attacked // 13 == self.trumpSuit else HIGHER[attacked] | self.trumps
+                moves.extend(('defend', card, attacked) for card in maskIndices(hand & beats))
+            return moves
+
+        elif player == self.attacker and not table:
+            moves = []
+            for value in {card % 13 for card in maskIndices(hand)}:
+                moves.extend(('attack', cards) for cards in subsets(hand & VALUES[value]))
+            return moves
+
+        elif self.defences and popcount(table) < self.maxAttacks:
+            joinable = hand & valuesIn(self.closedAttacks | self.defences)
+            return [DECLINE] + [('joinAttack', card) for card in maskIndices(joinable)]
+
+        return []
+
+    # Rules, as in Game.
+
+    def _changed(self):
+        for player in self.activePlayers:
+            self.declinedToAttack[player] = False
+
+    def _nextPlayer(self, player):
+        return self.activePlayers[(self.activePlayers.index(player) + 1) % len(self.activePlayers)]
+
+    def _previousPlayer(self, player):
+        return self.activePlayers[(self.activePlayers.index(player) - 1) % len(self.activePlayers)]
+
+    def _pickUpCards(self):
+        if self.dealt < len(self.deck):
+            player = self.defender
+            for _ in range(len(self.activePlayers)):
+                shortage = self.minCards - popcount(self.hands[player])
+                if shortage > 0 and self.dealt < len(self.deck):
+                    for card in self.deck[self.dealt:self.dealt + shortage]:
+                        self.hands[player] |= 1 << card
+                    self.dealt = min(self.dealt + shortage, len(self.deck))
+                player = self._previousPlayer(player)
+        self._changed()
+
+    def _successfulDefence(self):
+        self.burned |= self.openAttacks | self.closedAttacks | self.defences
+        self.openAttacks = self.closedAttacks = self.defences = 0
+        self.attacker = self.defender
+        self.defender = self._nextPlayer(self.attacker)
+        self._pickUpCards()
+
+    def _attack(self, player, cards):
+        self.hands[player] &= ~cards
+        self.openAttacks |= cards
+        self._changed()
+
+    def _joinAttack(self, player, card):
+        self.hands[player] &= ~(1 << card)
+        self.openAttacks |= 1 << card
+        self._changed()
+
+    def _bounce(self, player, cards):
+        self.hands[player] &= ~cards
+        self.openAttacks |= cards
+        self.attacker = player
+        self.defender = self._nextPlayer(player)
+        self._changed()
+
+    def _defend(self, player, card, attacked):
+        self.hands[player] &= ~(1 << card)
+        self.openAttacks &= ~(1 << attacked)
+        self.closedAttacks |= 1 << attacked
+        self.defences |= 1 << card
+        self.declinedToAttack[player] = False
+        if popcount(self.defences) == self.maxAttacks or not self.hands[player]:
+            self._successfulDefence()
+        else:
+            self._changed()
+
+    def _concede(self, player, cards):
+        self.hands[player] |= self.closedAttacks | self.defences | cards
+        self.burned |= self.openAttacks & ~cards
+        self.openAttacks = self.closedAttacks = self.defences = 0
+        self.attacker = self._nextPlayer(player)
+        self.defender = self._nextPlayer(self.attacker)
+        self._pickUpCards()
+
+    def _declineToAttack(self, player):
+        self.declinedToAttack[player] = True
+        decliners = sum(self.declinedToAttack[player] for player in self.activePlayers)
+        if not self.openAttacks and decliners == len(self.activePlayers) - 1:
+            self._successfulDefence()
+
+    def _done(self, player):
+        roles = (self.attacker, self.defender)
+        if player == self.attacker:
+            self.attacker = self._nextPlayer(player)
+            self.defender = self._nextPlayer(self.attacker)
+        elif player == self.defender:
+            self.defender = self._nextPlayer(player)
+        self.activePlayers.remove(player)
+        if len(self.activePlayers) == 1:
+            loser = self.activePlayers[0]
+            self.hands[loser] |= self.openAttacks | self.closedAttacks | self.defences
+            self.openAttacks = self.closedAttacks = self.defences = 0
+        elif (self.attacker, self.defender) == roles:
+            # Nobody can see anything new, so nobody's decision not to attack is reset.
+            return
+        self._changed()
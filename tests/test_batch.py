@@ -0,0 +1,96 @@
+import random
+
+import numpy
+import pytest
+
+from batch import BatchGame
+from game import Game
+from player import Player, WAIT
+
+
+def cardMask(cards):
+    mask = numpy.zeros((4, 13), dtype=bool)
+    mask[cards] = True
+    return mask
+
+
+def playRandomly(batch, player, rng, maxSteps=2000):
+    # Drives every game in the batch with uniformly random legal moves, as a Scheduler would: players out of cards
+    # declare themselves out, then the first player round the table with something to do moves. Moves of the same
+    # kind are made in every game at once. Checks after each step that every card is in exactly one place.
+    numberOfPlayers = batch.numberOfPlayers
+    current = batch.attacker.copy()
+    zones = list(range(numberOfPlayers)) + [batch.openAttacks, batch.closedAttacks, batch.defences, batch.burned,
+                                            batch.pack]
+    for step in range(maxSteps):
+        if batch.finished().all():
+            return step
+        for p in range(numberOfPlayers):
+            out = (batch.observe(p)[:, 0].sum(axis=(1, 2)) == 0) & batch.activePlayers[:, p]
+            if out.any():
+                batch.done(out, p)
+        observations = [batch.observe(p) for p in range(numberOfPlayers)]
+
+        moves = {}
+        for game in numpy.flatnonzero(~batch.finished()):
+            for offset in range(numberOfPlayers):
+                p = (current[game] + offset) % numberOfPlayers
+                if not batch.activePlayers[game, p]:
+                    continue
+                action = rng.choice(player.getPossibleActions(observations[p][game]))
+                if action != WAIT:
+                    moves.setdefault(action[0], []).append((game, p, action))
+                    current[game] = (p + 1) % numberOfPlayers
+                    break
+            else:
+                raise AssertionError(f'Nobody can move in game {game}')
+
+        for kind, kindMoves in moves.items():
+            games = numpy.zeros(batch.numberOfGames, dtype=bool)
+            players = numpy.zeros(batch.numberOfGames, dtype=int)
+            first = numpy.zeros((batch.numberOfGames, 4, 13), dtype=bool)
+            second = numpy.zeros((batch.numberOfGames, 4, 13), dtype=bool)
+            for game, p, action in kindMoves:
+                games[game] = True
+                players[game] = p
+                if len(action) > 1:
+                    first[game] = cardMask(action[1])
+                if len(action) > 2:
+                    second[game] = cardMask(action[2])
+            if kind == 'joinAttack':
+                batch.joinAttack(games, players, first)
+            elif kind == 'declineToAttack':
+                batch.declineToAttack(games, players)
+            elif kind == 'defend':
+                batch.defend(games, first, second)
+            else:
+                # attack, bounce and concede only need their cards.
+                getattr(batch, kind)(games, first)
+
+        assert numpy.all(batch.state[:, zones].sum(axis=1) == 1)
+    raise AssertionError(f'Not every game finished in {maxSteps} steps')
+
+
+@pytest.mark.parametrize('numberOfPlayers', [2, 4])
+def testRandomGamesFinish(numberOfPlayers):
+    batch = BatchGame(20, numberOfPlayers, 6, 5, seed=numberOfPlayers)
+    # Player only needs a game for its rules and random stream; its choices here come from 'rng'.
+    player = Player(0, Game(numberOfPlayers, 6, 5, synchronised=False, seed=0))
+    playRandomly(batch, player, random.Random(numberOfPlayers))
+
+    assert numpy.all(batch.finished())
+    losers = batch.loser()
+    assert numpy.all(batch.activePlayers.sum(axis=1) == 1)
+    assert numpy.all(batch.activePlayers[batch.games, losers])
+    # The loser ends up with every card that wasn't burned.
+    held = batch.state[batch.games, losers].sum(axis=(1, 2))
+    assert numpy.all(held + batch.state[:, batch.burned].sum(axis=(1, 2)) == 52)
+
+
+def testSameSeedSameGames():
+    batches = [BatchGame(10, 3, 6, 5, seed=4) for _ in range(2)]
+    player = Player(0, Game(3, 6, 5, synchronised=False, seed=0))
+    for batch in batches:
+        playRandomly(batch, player, random.Random(4))
+    assert numpy.array_equal(batches[0].state, batches[1].state)
+    assert numpy.array_equal(batches[0].turns, batches[1].turns)
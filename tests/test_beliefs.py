@@ -0,0 +1,88 @@
+import numpy
+
+from beliefs import Beliefs
+from game import Game, seedStreams
+from player import Player
+from simulation import Scheduler
+
+
+class ObservationRecorder:
+    # Stands in for Game.step, keeping every player's observation after every move, so all their sequences are
+    # the same length and can be fed to one batched tracker.
+    def __init__(self, game):
+        self.game = game
+        self.observations = [[self._observe(player)] for player in range(game.numberOfPlayers)]
+
+    def _observe(self, player):
+        return numpy.array(self.game.getState(player))
+
+    def step(self, player, action):
+        self.game.step(player, action)
+        for other in self.game.activePlayers:
+            self.observations[other].append(self._observe(other))
+
+
+def testExactWithTwoPlayers():
+    # With only one opponent, who played every card we didn't and drew everything we didn't, nothing needs
+    # estimating: hand and pack sizes are right, and every card is either known or shared out evenly.
+    for gameSeed in seedStreams(1, 5):
+        game = Game(2, 6, 6, synchronised=False, seed=gameSeed)
+        players = [Player(i, game, trackBeliefs=True) for i in range(2)]
+        checked = 0
+        for player in players:
+            original = player.observe
+
+            def observe(state, player=player, original=original):
+                nonlocal checked
+                original(state)
+                opponent = 1 - player.name
+                beliefs = player.beliefs
+                hand = game.state[opponent] == 1
+                probabilities = beliefs.probabilities()[0]
+                assert beliefs.expectedHandSizes()[0] == game.engine.numberOfCards(opponent)
+                assert beliefs.expectedPackSize() == game.engine.numberOfCards(game.pack)
+                assert numpy.isclose(probabilities.sum(), hand.sum())
+                assert numpy.all(probabilities[hand] > 0)
+                assert numpy.all(probabilities[beliefs.known[0, 0].reshape(4, 13)] == 1)
+                assert numpy.all(hand[beliefs.known[0, 0].reshape(4, 13)])
+                checked += 1
+
+            player.observe = observe
+        Scheduler(game, players).run()
+        assert checked > 0
+
+
+def testBatchedAgreesWithSingle():
+    for numberOfPlayers in [2, 4]:
+        for gameSeed in seedStreams(numberOfPlayers, 3):
+            game = Game(numberOfPlayers, 6, 5, synchronised=False, seed=gameSeed)
+            recorder = ObservationRecorder(game)
+            Scheduler(game, [Player(i, game) for i in range(numberOfPlayers)], recorder).run()
+
+            steps = min(len(observations) for observations in recorder.observations)
+            batched = Beliefs(numberOfPlayers, 6, batchSize=numberOfPlayers)
+            singles = [Beliefs(numberOfPlayers, 6) for _ in range(numberOfPlayers)]
+            for step in range(steps):
+                batched.update(numpy.stack([observations[step] for observations in recorder.observations]))
+                for player, single in enumerate(singles):
+                    single.update(recorder.observations[player][step])
+                assert numpy.allclose(batched.probabilities(), [single.probabilities() for single in singles])
+                assert numpy.allclose(batched.packProbabilities(), [single.packProbabilities() for single in singles])
+                assert numpy.allclose(batched.expectedHandSizes(), [single.expectedHandSizes() for single in singles])
+                assert numpy.allclose(batched.expectedPackSize(), [single.expectedPackSize() for single in singles])
+
+
+def testResetStartsAgain():
+    game = Game(3, 6, 5, synchronised=False, seed=7)
+    recorder = ObservationRecorder(game)
+    Scheduler(game, [Player(i, game) for i in range(3)], recorder).run()
+    observations = recorder.observations[0]
+    beliefs = Beliefs(3, 6)
+    for observation in observations[:20]:
+        beliefs.update(observation)
+    beliefs.reset()
+    beliefs.update(observations[20])
+    fresh = Beliefs(3, 6)
+    fresh.update(observations[20])
+    assert numpy.allclose(beliefs.probabilities(), fresh.probabilities())
+    assert numpy.allclose(beliefs.expectedHandSizes(), fresh.expectedHandSizes())
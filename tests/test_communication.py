@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import numpy
+import pytest
+
+from communication import AsyncUpdateQueue, UpdateQueue
+from game import Game
+from player import Player
+
+
+def testUnboundedQueueKeepsEverything():
+    queue = UpdateQueue()
+    for value in range(100):
+        queue.send(value)
+    assert queue.receiveAll() == list(range(100))
+    assert queue.dropped == 0
+
+
+def testDropToLatest():
+    queue = UpdateQueue(maxsize=2, dropToLatest=True)
+    for value in range(5):
+        queue.send(value)
+    assert queue.dropped == 3
+    assert queue.receiveAll() == [3, 4]
+    queue.send(5)
+    assert queue.receiveLatest() == 5
+
+
+def testBackpressure():
+    queue = UpdateQueue(maxsize=2)
+    sent = []
+
+    def send():
+        for value in range(4):
+            queue.send(value)
+            sent.append(value)
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    received = []
+    while len(received) < 4:
+        received.append(queue.receive())
+        # The sender can never get more than two ahead.
+        assert len(queue) <= 2
+    sender.join(timeout=10)
+    assert not sender.is_alive()
+    assert received == sent == list(range(4))
+    assert queue.dropped == 0
+
+
+def testOutstanding():
+    queue = UpdateQueue()
+    queue.send(0)
+    queue.send(1)
+    assert queue.outstanding() == 2
+    queue.receiveAll()
+    # Taken, but the consumer may still be using them until it comes back for more.
+    assert queue.outstanding() == 2
+    queue.send(2)
+    queue.receiveAll()
+    assert queue.outstanding() == 1
+
+
+def testAsyncQueue():
+    async def run():
+        queue = AsyncUpdateQueue(maxsize=2)
+        queue.send(0)
+        queue.send(1)
+        with pytest.raises(asyncio.QueueFull):
+            queue.send(2)
+        # 'put' waits for space instead.
+        putting = asyncio.ensure_future(queue.put(2))
+        await asyncio.sleep(0)
+        assert not putting.done()
+        assert await queue.receive() == 0
+        await putting
+        assert await queue.receiveAll() == [1, 2]
+
+        dropping = AsyncUpdateQueue(maxsize=1, dropToLatest=True)
+        for value in range(3):
+            dropping.send(value)
+        assert dropping.dropped == 2
+        assert await dropping.receiveLatest() == 2
+
+    asyncio.run(run())
+
+
+class SentQueue(UpdateQueue):
+    # Keeps a copy of everything sent, as it was when it was sent.
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, value):
+        self.sent.append(numpy.array(value[1]))
+        super().send(value)
+
+
+class SlowPlayer(Player):
+    # Keeps a copy of every observation as it sees it, taking its time over each one so the game gets ahead.
+    def __init__(self, name, game, delay):
+        super().__init__(name, game)
+        self.delay = delay
+        self.seen = []
+
+    def observe(self, state):
+        time.sleep(self.delay)
+        self.seen.append(numpy.array(state))
+
+
+def testPlayersMissNoUpdates():
+    # With a ring of only two observations, the slow player falls further behind than that: its ring must grow
+    # rather than overwrite anything it hasn't read yet.
+    game = Game(3, 6, 5, observationBuffers=2, channel=SentQueue, seed=3)
+    players = [SlowPlayer(i, game, 0.002 if i == 0 else 0) for i in range(3)]
+    threads = [threading.Thread(target=player.play) for player in players]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+        assert not thread.is_alive()
+
+    for player in players:
+        queue = game.toPlayers[player.name]
+        assert queue.dropped == 0
+        # A player stops reading once it's out, or has lost, so it may not see the last few updates.
+        assert 0 < len(player.seen) <= len(queue.sent)
+        assert all(numpy.array_equal(seen, sent) for seen, sent in zip(player.seen, queue.sent))
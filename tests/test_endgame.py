@@ -0,0 +1,79 @@
+import random
+
+from endgame import EndgameSolver, TranspositionTable, canonicalKey
+from engines import FULL
+from simulator import Simulator
+
+
+def minimax(simulator, path):
+    # The loser with perfect play, or None for a draw, searching every line with no table: a position that comes
+    # round again on the same line is a draw.
+    turn = simulator.nextMover()
+    if turn is None:
+        return simulator.loser()
+    (player, moves) = turn
+    other = simulator.activePlayers[0] if simulator.activePlayers[1] == player else simulator.activePlayers[1]
+    key = canonicalKey(simulator, player)
+    if key in path:
+        return None
+    path.add(key)
+    loser = player
+    for move in moves:
+        undo = simulator.make(player, move)
+        result = minimax(simulator, path)
+        simulator.undo(undo)
+        if result == other:
+            loser = other
+            break
+        if result is None:
+            loser = None
+    path.remove(key)
+    return loser
+
+
+def endgames(seed, count):
+    # Small two-player positions with the pack gone and everything else burned.
+    rng = random.Random(seed)
+    for _ in range(count):
+        cards = rng.sample(range(52), rng.randint(4, 6))
+        split = rng.randint(1, len(cards) - 1)
+        hands = [sum(1 << card for card in cards[:split]), sum(1 << card for card in cards[split:])]
+        burned = FULL & ~(hands[0] | hands[1])
+        yield Simulator(2, 6, rng.choice([2, 6]), rng.randrange(4), hands, [], 0, 1, [0, 1], 0, burned=burned)
+
+
+def testSolverAgreesWithMinimax():
+    solver = EndgameSolver()
+    for simulator in endgames(5, 25):
+        expected = minimax(simulator.clone(), set())
+        assert solver.loser(simulator) == expected
+    assert len(solver.table) > 0
+
+
+def testWinningMoveWins():
+    solver = EndgameSolver()
+    for simulator in endgames(6, 15):
+        move = solver.winningMove(simulator, 0)
+        if move is None:
+            assert minimax(simulator.clone(), set()) != 1
+        else:
+            simulator.make(0, move)
+            assert minimax(simulator, set()) == 1
+
+
+def testTableRoundTrip(tmp_path):
+    solver = EndgameSolver()
+    for simulator in endgames(7, 10):
+        solver.loser(simulator)
+    path = str(tmp_path / 'table.npy')
+    solver.table.save(path)
+    loaded = TranspositionTable(path=path)
+    assert list(loaded.entries.items()) == list(solver.table.entries.items())
+
+    # A table too small for everything keeps the most recently used positions.
+    small = TranspositionTable(size=3, path=path)
+    assert list(small.entries.items()) == list(solver.table.entries.items())[-3:]
+
+    empty = TranspositionTable()
+    empty.save(path)
+    assert len(TranspositionTable(path=path)) == 0
@@ -0,0 +1,48 @@
+import random
+
+import numpy
+
+from engines import ArrayEngine, BitboardEngine, cardsMask, maskCards, valuesMask
+
+
+def testCardsMask():
+    expected = 1 << 3 | 1 << 18
+    assert cardsMask((1, 5)) == 1 << 18
+    assert cardsMask(((0, 1), (3, 5))) == expected
+    assert cardsMask((numpy.array([0, 1]), numpy.array([3, 5]))) == expected
+    assert cardsMask(18) == 1 << 18
+    assert cardsMask([3, 18]) == expected
+    assert cardsMask(numpy.array([3, 18])) == expected
+    assert cardsMask([]) == 0
+    assert all(numpy.array_equal(a, b) for a, b in zip(maskCards(expected), ([0, 1], [3, 5])))
+    assert valuesMask(1 << 3 | 1 << 16 | 1 << 18) == 1 << 3 | 1 << 5
+
+
+def testEnginesAgree():
+    # The same random moves under both engines, with every query compared after each one.
+    rng = random.Random(0)
+    (array, bitboard) = engines = [ArrayEngine(6), BitboardEngine(6)]
+    for engine in engines:
+        engine.fill(5)
+        engine.fillSuit(4, 2)
+    for move in range(200):
+        (fromZone, toZone) = rng.sample(range(4), 2) if move else (5, 0)
+        held = numpy.flatnonzero(array.observe([fromZone])).tolist()
+        if not held:
+            continue
+        cards = numpy.divmod(numpy.array(rng.sample(held, rng.randint(1, min(3, len(held))))), 13)
+        everything = rng.random() < 0.1
+        for engine in engines:
+            if everything:
+                engine.moveAll(fromZone, toZone)
+            else:
+                engine.moveCards(cards, fromZone, toZone)
+
+        zones = rng.sample(range(6), 3)
+        assert numpy.array_equal(array.observe(zones), bitboard.observe(zones))
+        assert numpy.array_equal(array.array(), bitboard.array())
+        for zone in range(6):
+            assert array.mask(zone) == bitboard.mask(zone)
+            assert array.numberOfCards(zone) == bitboard.numberOfCards(zone)
+            assert all(numpy.array_equal(a, b) for a, b in zip(array.getCards(zone), bitboard.getCards(zone)))
+        assert array.valuesIn(zones) == bitboard.valuesIn(zones)
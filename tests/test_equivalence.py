@@ -0,0 +1,150 @@
+import numpy
+import pytest
+
+from deltas import ActionDeltas
+from engines import BitboardEngine, cardsMask
+from game import Game, seedStreams
+from player import Player
+from records import RecordReader, RecordWriter, Recorder, replay
+from simulation import Scheduler
+from simulator import actionToMove, simulatorFromGame
+
+# Seeded games under a Scheduler, with every move checked against the other implementations of the rules:
+# ActionSpace.legalMask, encode and decode against Player's own actions, a Simulator stepped alongside the game,
+# and ActionDeltas, one at a time and batched, against the cards the move actually moved.
+
+GAMES = 3
+
+
+def gameZones(game):
+    # Every hand, the table and the burned cards as card masks, then the roles: what a Simulator keeps.
+    zones = list(range(game.numberOfPlayers)) + [game.openAttacks, game.closedAttacks, game.defences, game.burned]
+    return ([cardsMask(game.engine.getCards(zone)) for zone in zones], game.attacker, game.defender,
+            list(game.activePlayers))
+
+
+def simulatorZones(simulator):
+    return (simulator.hands + [simulator.openAttacks, simulator.closedAttacks, simulator.defences, simulator.burned],
+            simulator.attacker, simulator.defender, list(simulator.activePlayers))
+
+
+def undealt(game, dealt):
+    # The game's state with everything dealt since 'dealt' cards had been put back in the pack, flattened.
+    state = game.state.reshape(game.numberOfPlayers + game.numberOfGlobalComponents, 52)
+    for card in game.deck[dealt:game.dealt]:
+        state[numpy.flatnonzero(state[:game.numberOfPlayers, card])[0], card] = 0
+        state[game.pack, card] = 1
+    return state
+
+
+class CheckingRecorder(Recorder):
+    # A Recorder that checks each move against the other implementations of the rules before and after making it,
+    # keeping every position and move the deltas can be applied to in one batch afterwards.
+    def __init__(self, game, players, deltas):
+        super().__init__(game)
+        self.players = players
+        self.deltas = deltas
+        self.simulator = simulatorFromGame(game)
+        self.batch = []
+
+    def step(self, player, action):
+        if action[0] == 'done':
+            super().step(player, action)
+            return
+        (game, space, deltas, simulator) = (self.game, self.space, self.deltas, self.simulator)
+        observation = numpy.array(game.getState(player))
+        actions = self.players[player].getPossibleActions(observation)
+        legal = {space.encode(legalAction, observation) for legalAction in actions}
+        assert set(numpy.flatnonzero(space.legalMask(observation)).tolist()) == legal
+        for legalAction in actions:
+            decoded = space.decode(space.encode(legalAction, observation), observation)
+            assert actionToMove(decoded) == actionToMove(legalAction)
+        turn = simulator.nextMover()
+        assert turn is not None and turn[0] == player
+        assert set(turn[1]) == set(map(actionToMove, actions))
+
+        index = space.encode(action, observation)
+        before = game.state
+        conceding = bool(deltas.conceding[index])
+        delta = deltas.concede(before, player, index) if conceding else deltas.delta(player, index)
+        (dealt, turns) = (game.dealt, game.turns)
+        super().step(player, action)
+        simulator.apply(player, actionToMove(action))
+        assert simulatorZones(simulator) == gameZones(game)
+
+        after = before.copy()
+        deltas.apply(after, delta)
+        after = after.reshape(-1, 52)
+        if game.turns != turns and not conceding:
+            # The move ended the round with a successful defence, which burned the whole table.
+            table = [game.openAttacks, game.closedAttacks, game.defences]
+            after[game.burned] += after[table].sum(axis=0)
+            after[table] = 0
+        assert numpy.array_equal(after, undealt(game, dealt))
+        if not conceding:
+            self.batch.append((before, player, index))
+
+
+def playCheckedGames(numberOfPlayers, minCards=6, maxAttacks=5, seed=0):
+    deltas = ActionDeltas(numberOfPlayers, maxAttacks)
+    recorders = []
+    for gameSeed in seedStreams(seed, GAMES):
+        game = Game(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, synchronised=False, seed=gameSeed)
+        players = [Player(i, game) for i in range(numberOfPlayers)]
+        recorder = CheckingRecorder(game, players, deltas)
+        Scheduler(game, players, recorder).run()
+        recorders.append(recorder)
+    return deltas, recorders
+
+
+@pytest.mark.parametrize('numberOfPlayers', [2, 3, 4, 6])
+def testMovesAgreeWithGame(numberOfPlayers):
+    (_, recorders) = playCheckedGames(numberOfPlayers)
+    assert all(len(recorder.game.activePlayers) == 1 for recorder in recorders)
+
+
+@pytest.mark.parametrize('numberOfPlayers', [2, 4])
+def testBatchedDeltasAgreeWithSingle(numberOfPlayers):
+    (deltas, recorders) = playCheckedGames(numberOfPlayers, seed=1)
+    batch = [move for recorder in recorders for move in recorder.batch]
+    states = numpy.stack([state for (state, _, _) in batch])
+    players = numpy.array([player for (_, player, _) in batch])
+    indices = numpy.array([index for (_, _, index) in batch])
+    singles = states.copy()
+    for row in range(len(states)):
+        deltas.apply(singles[row], deltas.delta(players[row], indices[row]))
+    batched = states.copy()
+    deltas.applyBatch(batched, players, indices)
+    assert numpy.array_equal(batched, singles)
+    deltas.undoBatch(batched, players, indices)
+    assert numpy.array_equal(batched, states)
+
+
+def testRecordsReplay(tmp_path):
+    (_, recorders) = playCheckedGames(3, seed=2)
+    path = str(tmp_path / 'games.rec')
+    with RecordWriter(path) as writer:
+        for recorder in recorders:
+            writer.write(recorder.record())
+    with RecordReader(path) as reader:
+        assert len(reader) == len(recorders)
+        for record, recorder in zip(reader, recorders):
+            replayed = replay(record)
+            assert numpy.array_equal(replayed.state, recorder.game.state)
+            assert replayed.turns == recorder.game.turns
+
+
+def testTruncatedRecordsAreRejected(tmp_path):
+    (_, recorders) = playCheckedGames(2, seed=3)
+    path = str(tmp_path / 'games.rec')
+    with RecordWriter(path) as writer:
+        writer.write(recorders[0].record())
+    with open(path, 'rb') as file:
+        data = file.read()
+    for name, contents in [('empty', b''), ('magic', b'XXXX' + data[4:]), ('header', data[:10]),
+                           ('moves', data[:-1])]:
+        broken = str(tmp_path / name)
+        with open(broken, 'wb') as file:
+            file.write(contents)
+        with pytest.raises(ValueError):
+            RecordReader(broken)
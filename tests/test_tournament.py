@@ -0,0 +1,62 @@
+import numpy
+
+from tournament import ELO, Ratings
+
+
+def playGames(ratings, strengths, games, rng):
+    # Two-player games between random pairs, won according to the Bradley-Terry model with these strengths.
+    for _ in range(games):
+        (first, second) = rng.choice(len(strengths), size=2, replace=False)
+        firstWins = rng.random() < 1 / (1 + numpy.exp(strengths[second] - strengths[first]))
+        ratings.add([first, second], second if firstWins else first)
+
+
+def testFitRecoversStrengths():
+    strengths = numpy.array([-1.0, 0.0, 1.0])
+    ratings = Ratings(['weak', 'middling', 'strong'])
+    playGames(ratings, strengths, 3000, numpy.random.default_rng(0))
+    ratings.fit()
+    assert numpy.isclose(ratings.strengths.sum(), 0)
+    assert ratings.ranking() == [2, 1, 0]
+    for entrant, strength in enumerate(strengths):
+        assert abs(ratings.rating(entrant) - (1500 + ELO * strength)) <= ratings.interval(entrant)
+    assert ratings.converged()
+
+
+def testEvenResultsGiveEvenRatings():
+    ratings = Ratings(['a', 'b'])
+    for _ in range(10):
+        ratings.add([0, 1], 0)
+        ratings.add([0, 1], 1)
+    ratings.fit()
+    assert numpy.allclose(ratings.strengths, 0)
+    assert not ratings.separated(0, 1)
+    assert not ratings.converged()
+
+
+def testPriorKeepsRatingsFinite():
+    # Without the prior, someone who has won every game would be infinitely better.
+    ratings = Ratings(['winner', 'loser'])
+    for _ in range(20):
+        ratings.add([0, 1], 1)
+    ratings.fit()
+    assert numpy.all(numpy.isfinite(ratings.strengths))
+    assert ratings.ranking() == [0, 1]
+    assert ratings.converged()
+
+
+def testOneLoserCountsAsOneGame():
+    # Losing a four-player game weighs as much as losing a two-player one, shared between the winners.
+    ratings = Ratings(['a', 'b', 'c', 'd'])
+    ratings.add([0, 1, 2, 3], 3)
+    assert numpy.isclose(ratings.wins[:, 3].sum(), 1)
+    assert list(ratings.games) == [1, 1, 1, 1]
+
+
+def testPrecisionStopsCloseContests():
+    ratings = Ratings(['a', 'b'])
+    playGames(ratings, numpy.zeros(2), 400, numpy.random.default_rng(1))
+    ratings.fit()
+    assert not ratings.converged()
+    assert ratings.converged(precision=max(ratings.interval(0), ratings.interval(1)))
+    assert not ratings.converged(precision=1)
@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import json
+import math
+import sys
+from functools import partial
+from multiprocessing import Pool
+from statistics import NormalDist
+
+import numpy
+
+from endgame import EndgamePlayer
+from engines import BitboardEngine
+from game import Game, dealFromSeed, seedStream
+from mcts import MCTSPlayer
+from player import GreedyPlayer, Player
+from simulation import Scheduler
+
+# Entrants are strategies: anything that makes a player for a seat at a game, called as entrant(name, game, seed=...),
+# such as a Player subclass or a partial of one. They need to be picklable to be sent to worker processes.
+ENTRANTS = {
+    'random': Player,
+    'greedy': GreedyPlayer,
+    'endgame': EndgamePlayer,
+    'mcts': partial(MCTSPlayer, iterations=200),
+}
+
+ELO = 400 / math.log(10)
+
+
+def seatings(lineup, seed, permutations=False):
+    # Every rotation of the entrants around the table, in an order drawn from the seed: each of them plays every
+    # seat's cards, and over many matches nobody always sits after the same opponent. That's one game per entrant;
+    # every permutation would balance the order around the table within a single match, but costs n! games.
+    if permutations:
+        return list(itertools.permutations(lineup))
+    order = [lineup[i] for i in numpy.random.default_rng(seed).permutation(len(lineup))]
+    return [tuple(order[start:] + order[:start]) for start in range(len(order))]
+
+
+def playMatch(task):
+    # One deal, played once for each seating of the entrants, so neither the deal nor who attacks first favours
+    # anyone. Each entrant's own choices come from the same stream in every seating too, whichever seat they're in.
+    # Returns the entrants in each game, by seat, and which of them lost.
+    (entrants, lineup, numberOfPlayers, minCards, maxAttacks, seed, permutations) = task
+    deal = dealFromSeed(numberOfPlayers, seed)
+    playerSeeds = seedStream(seed, 1)
+
+    losers = []
+    for seats in seatings(lineup, seedStream(seed, 2), permutations):
+        game = Game(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, synchronised=False,
+                    trumps=deal.trumps, attacker=deal.attacker, deck=deal.deck)
+        players = [entrants[entrant](seat, game, seed=seedStream(playerSeeds, entrant))
+                   for seat, entrant in enumerate(seats)]
+        losers.append((seats, seats[Scheduler(game, players).run()]))
+    return losers
+
+
+class Ratings:
+    # Bradley-Terry ratings on the Elo scale, fitted to every game so far. A game with one loser counts as the
+    # loser losing to each of the others, but since those results all hang on the same game, together they only
+    # weigh as much as one. Every pair starts off with 'prior' games' worth of even results, so
+    # ratings stay finite before anyone has won or lost, and entrants that never meet are drawn together.
+    def __init__(self, names, prior=1.0, confidence=0.95):
+        self.names = names
+        self.wins = numpy.zeros((len(names), len(names)))
+        self.games = numpy.zeros(len(names), dtype=int)
+        self.prior = prior
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.strengths = numpy.zeros(len(names))
+        self.covariance = numpy.zeros((len(names), len(names)))
+
+    def add(self, seats, loser):
+        for entrant in seats:
+            self.games[entrant] += 1
+            if entrant != loser:
+                self.wins[entrant, loser] += 1 / (len(seats) - 1)
+
+    def fit(self):
+        # Maximum likelihood, by Newton's method from the last fit, with strengths summing to zero; the covariance
+        # is the inverse of the information, which gives each rating's confidence interval.
+        wins = self.wins + self.prior / 2 * (1 - numpy.eye(len(self.names)))
+        played = wins + wins.T
+        strengths = self.strengths
+        for _ in range(100):
+            p = 1 / (1 + numpy.exp(strengths[None, :] - strengths[:, None]))
+            gradient = (wins - played * p).sum(axis=1)
+            weights = played * p * (1 - p)
+            information = numpy.diag(weights.sum(axis=1)) - weights
+            covariance = numpy.linalg.pinv(information)
+            step = covariance @ gradient
+            strengths = strengths + step - numpy.mean(step)
+            if numpy.max(numpy.abs(step)) < 1e-9:
+                break
+        self.strengths = strengths
+        self.covariance = covariance
+
+    def rating(self, entrant):
+        return 1500 + ELO * self.strengths[entrant]
+
+    def interval(self, entrant):
+        return self.z * ELO * math.sqrt(max(self.covariance[entrant, entrant], 0))
+
+    def separated(self, first, second):
+        # Whether the difference between two ratings is significant.
+        variance = self.covariance[first, first] + self.covariance[second, second] - 2 * self.covariance[first, second]
+        return abs(self.strengths[first] - self.strengths[second]) > self.z * math.sqrt(max(variance, 0))
+
+    def ranking(self):
+        return sorted(range(len(self.names)), key=lambda entrant: -self.strengths[entrant])
+
+    def converged(self, precision=None):
+        # Once every entrant is significantly better than the next one down, more games won't change the order.
+        # Entrants too close to tell apart keep it going, until every interval is narrower than 'precision', if
+        # that's given.
+        ranking = self.ranking()
+        if all(self.separated(first, second) for first, second in zip(ranking, ranking[1:])):
+            return True
+        return precision is not None and all(self.interval(entrant) <= precision for entrant in ranking)
+
+    def standings(self):
+        return [{'name': self.names[entrant], 'rating': self.rating(entrant), 'interval': self.interval(entrant),
+                 'games': int(self.games[entrant])} for entrant in self.ranking()]
+
+
+def lineups(ratings, numberOfPlayers, schedule):
+    # Who plays whom in a round. Round robin: every group of entrants. Swiss: entrants in order of rating, in
+    # consecutive groups, the last of them filled up from the ones just above if need be.
+    entrants = list(range(len(ratings.names)))
+    if schedule == 'roundRobin':
+        return [list(group) for group in itertools.combinations(entrants, numberOfPlayers)]
+    ranking = ratings.ranking()
+    groups = [ranking[start:start + numberOfPlayers] for start in range(0, len(ranking), numberOfPlayers)]
+    if len(groups[-1]) < numberOfPlayers:
+        groups[-1] = ranking[-numberOfPlayers:]
+    return groups
+
+
+def tournament(entrants, numberOfPlayers=2, minCards=6, maxAttacks=5, schedule='roundRobin', workers=None,
+               seed=0, minRounds=2, maxRounds=100, precision=None, confidence=0.95, prior=1.0, permutations=False):
+    # Plays rounds of matches on a pool of worker processes, yielding the Ratings after each round, until the
+    # ratings converge (after at least minRounds) or maxRounds have been played. 'entrants' maps names to
+    # strategies. Matches seat every rotation of their entrants, or with 'permutations', every ordering.
+    names = list(entrants)
+    strategies = [entrants[name] for name in names]
+    if len(names) < numberOfPlayers:
+        raise ValueError(f'{numberOfPlayers} player games need at least {numberOfPlayers} entrants')
+    ratings = Ratings(names, prior, confidence)
+    seeds = numpy.random.SeedSequence(seed)
+
+    with Pool(workers) as pool:
+        for played in range(1, maxRounds + 1):
+            groups = lineups(ratings, numberOfPlayers, schedule)
+            tasks = [(strategies, group, numberOfPlayers, minCards, maxAttacks, child, permutations)
+                     for group, child in zip(groups, seeds.spawn(len(groups)))]
+            for results in pool.imap_unordered(playMatch, tasks):
+                for (seats, loser) in results:
+                    ratings.add(seats, loser)
+            ratings.fit()
+            yield ratings
+            if played >= minRounds and ratings.converged(precision):
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate strategies against each other.')
+    parser.add_argument('--entrants', nargs='+', default=list(ENTRANTS), choices=list(ENTRANTS))
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--min-cards', type=int, default=6)
+    parser.add_argument('--max-attacks', type=int, default=5)
+    parser.add_argument('--schedule', choices=['roundRobin', 'swiss'], default='roundRobin')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-rounds', type=int, default=2)
+    parser.add_argument('--max-rounds', type=int, default=100)
+    parser.add_argument('--precision', type=float, default=None,
+                        help='Also stop once every rating is known to within this many Elo points.')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--permutations', action='store_true',
+                        help='Play every ordering of each match\'s entrants around the table, not just every rotation.')
+    args = parser.parse_args()
+
+    rounds = tournament({name: ENTRANTS[name] for name in args.entrants}, args.players, args.min_cards,
+                        args.max_attacks, args.schedule, args.workers, args.seed, args.min_rounds, args.max_rounds,
+                        args.precision, args.confidence, permutations=args.permutations)
+    for played, ratings in enumerate(rounds, 1):
+        table = ', '.join(f"{entry['name']} {entry['rating']:.0f}±{entry['interval']:.0f}"
+                          for entry in ratings.standings())
+        print(f'Round {played}: {table}', file=sys.stderr)
+    print(json.dumps({'rounds': played, 'standings': ratings.standings()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import itertools
+import multiprocessing
+import queue
+from collections import namedtuple
+
+import numpy
+
+from actions import ActionSpace
+from engines import BitboardEngine
+from game import Game, seedStream
+from player import Player
+from simulation import Scheduler
+
+try:
+    import tensorflow
+except ImportError:
+    tensorflow = None
+
+# Training data straight from self-play: worker processes play games and send back every decision, which are
+# mixed in a fixed-size shuffle buffer on the way out, so nothing is ever held in memory but the buffer and a few
+# games in flight.
+#
+# Each decision is a Transition, seen from the player who made it: their observation, in the layout of
+# Game._playerState, which actions were legal in it and the ActionSpace index of the one they took. Rewards only
+# come at the end of each player's game, on their last decision, which is also the only one marked done.
+Transition = namedtuple('Transition', ['observation', 'legal', 'action', 'reward', 'done'])
+
+
+# Rewards, for a player whose game has just ended: either they've gone out, or everyone else has.
+
+def loserReward(game, player):
+    # No winner, only a loser.
+    return -1.0 if game.activePlayers == [player] else 1.0
+
+
+def cardCountReward(game, player):
+    # Going out scores however many cards everyone else still holds; losing scores minus those left in hand.
+    if game.activePlayers == [player]:
+        return -float(game.engine.numberOfCards(player))
+    return float(sum(game.engine.numberOfCards(other) for other in game.activePlayers))
+
+
+class DecisionRecorder:
+    # Stands in for Game.step, as records.Recorder does, keeping each player's decisions and, once their game is
+    # over, their reward.
+    def __init__(self, game, space, reward):
+        self.game = game
+        self.space = space
+        self.reward = reward
+        self.decisions = [[] for _ in range(game.numberOfPlayers)]
+        self.rewards = [0.0] * game.numberOfPlayers
+
+    def step(self, player, action):
+        game = self.game
+        if action[0] != 'done':
+            observation = game.getState(player)
+            self.decisions[player].append((numpy.array(observation, dtype=numpy.int8),
+                                           self.space.encode(action, observation)))
+        game.step(player, action)
+        if action[0] == 'done':
+            self.rewards[player] = self.reward(game, player)
+            if len(game.activePlayers) == 1:
+                self.rewards[game.activePlayers[0]] = self.reward(game, game.activePlayers[0])
+
+
+def playTrainingGame(numberOfPlayers, minCards, maxAttacks, space, reward=loserReward, playerType=Player, seed=None):
+    # One game, as arrays with a row for each decision, grouped by player and in order within each player's game.
+    game = Game(numberOfPlayers, minCards, maxAttacks, engine=BitboardEngine, synchronised=False, seed=seed)
+    recorder = DecisionRecorder(game, space, reward)
+    Scheduler(game, [playerType(i, game) for i in range(numberOfPlayers)], recorder).run()
+    (decisions, rewards) = (recorder.decisions, recorder.rewards)
+
+    observations = []
+    actions = []
+    finalRewards = []
+    dones = []
+    for player, played in enumerate(decisions):
+        for i, (observation, action) in enumerate(played):
+            last = i == len(played) - 1
+            observations.append(observation)
+            actions.append(action)
+            finalRewards.append(rewards[player] if last else 0.0)
+            dones.append(last)
+    observations = numpy.array(observations, dtype=numpy.int8).reshape(-1, 8, 4, 13)
+    return (observations, space.legalMask(observations), numpy.array(actions, dtype=numpy.int32),
+            numpy.array(finalRewards, dtype=numpy.float32), numpy.array(dones, dtype=bool))
+
+
+def _seeds(seed, worker, workers, games):
+    # Worker w plays games w, w + workers, w + 2 * workers, ...: forever, unless there's a number of games. Each
+    # game gets the stream of the seed with its number.
+    game = worker
+    while games is None or game < games:
+        yield seedStream(seed, game)
+        game += workers
+
+
+def _produce(numberOfPlayers, minCards, maxAttacks, reward, playerType, seed, worker, workers, games, output, stop):
+    # A worker: plays its share of the games, each seeded on its own so they don't depend on which worker plays
+    # them, and hands them over in order on its own queue, waiting while the consumer is behind. Ends by sending
+    # None.
+    space = ActionSpace(maxAttacks)
+    for gameSeed in _seeds(seed, worker, workers, games):
+        arrays = playTrainingGame(numberOfPlayers, minCards, maxAttacks, space, reward, playerType, gameSeed)
+        while not stop.is_set():
+            try:
+                output.put(arrays, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        if stop.is_set():
+            return
+    output.put(None)
+
+
+class SelfPlayStream:
+    # Iterating gives Transitions, shuffled through a buffer of 'bufferSize' of them: the first only comes once
+    # the buffer is full (or every game has been played), and then each new one takes the place of a random one
+    # already there. Games are played by 'workers' processes, at most 'prefetch' games ahead of the consumer; or
+    # with no workers, in this process as they're needed. Without a number of games, it never ends. Games go into
+    # the buffer in the order they're numbered, however many workers there are and however fast each one is, so
+    # the same seed always gives the same stream.
+    def __init__(self, numberOfPlayers, minCards, maxAttacks, reward=loserReward, playerType=Player, games=None,
+                 workers=2, bufferSize=10000, prefetch=8, seed=0):
+        self.numberOfPlayers = numberOfPlayers
+        self.minCards = minCards
+        self.maxAttacks = maxAttacks
+        self.reward = reward
+        self.playerType = playerType
+        self.games = games
+        self.workers = workers
+        self.bufferSize = bufferSize
+        self.prefetch = prefetch
+        self.seed = seed
+        self.space = ActionSpace(maxAttacks)
+        self.processes = []
+        self.outputs = []
+        self.stop = None
+
+    def _games(self):
+        if self.workers == 0:
+            for seed in _seeds(self.seed, 0, 1, self.games):
+                yield playTrainingGame(self.numberOfPlayers, self.minCards, self.maxAttacks, self.space,
+                                       self.reward, self.playerType, seed)
+            return
+
+        # Game i is always the next one from worker i % workers, so taking them from each worker's queue in turn
+        # puts them back in order. The first worker to run out has played the last game.
+        context = multiprocessing.get_context()
+        self.outputs = [context.Queue(max(self.prefetch // self.workers, 1)) for _ in range(self.workers)]
+        self.stop = context.Event()
+        self.processes = [
+            context.Process(target=_produce, daemon=True, args=(
+                self.numberOfPlayers, self.minCards, self.maxAttacks, self.reward, self.playerType, self.seed,
+                worker, self.workers, self.games, self.outputs[worker], self.stop))
+            for worker in range(self.workers)]
+        for process in self.processes:
+            process.start()
+        try:
+            for game in itertools.count():
+                arrays = self.outputs[game % self.workers].get()
+                if arrays is None:
+                    return
+                yield arrays
+        finally:
+            self.close()
+
+    def __iter__(self):
+        rng = numpy.random.default_rng(self.seed)
+        buffer = []
+        for arrays in self._games():
+            for transition in zip(*arrays):
+                if len(buffer) < self.bufferSize:
+                    buffer.append(transition)
+                    continue
+                i = rng.integers(len(buffer))
+                yield Transition(*buffer[i])
+                buffer[i] = transition
+        for i in rng.permutation(len(buffer)):
+            yield Transition(*buffer[i])
+
+    def close(self):
+        # Stops the workers; a stream can be iterated again afterwards, from the start. Games still on their way
+        # are taken off the queues, since a worker can't finish while it's sending one.
+        if self.stop is not None:
+            self.stop.set()
+            while any(process.is_alive() for process in self.processes):
+                for output in self.outputs:
+                    try:
+                        output.get(timeout=0.05 / len(self.outputs))
+                    except queue.Empty:
+                        pass
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.outputs = []
+        self.stop = None
+
+    def dataset(self, batchSize=None):
+        # The stream as a tf.data.Dataset of (observation, legal, action, reward, done), batched if asked, and
+        # prefetching so that producing the next batch overlaps training on this one.
+        if tensorflow is None:
+            raise ImportError('SelfPlayStream.dataset needs TensorFlow; iterate over the stream itself without it')
+        dataset = tensorflow.data.Dataset.from_generator(
+            lambda: iter(self),
+            output_types=(tensorflow.int8, tensorflow.bool, tensorflow.int32, tensorflow.float32, tensorflow.bool),
+            output_shapes=((8, 4, 13), (self.space.size,), (), (), ()))
+        if batchSize is not None:
+            dataset = dataset.batch(batchSize)
+        return dataset.prefetch(tensorflow.data.experimental.AUTOTUNE)